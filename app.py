@@ -0,0 +1,3380 @@
+import discord
+from discord.ext import commands
+from discord.ui import Button, View
+import os
+import gzip
+import json
+import hashlib
+import re
+import tempfile
+import contextlib
+import sqlite3
+import heapq
+import time
+import signal
+import subprocess
+import multiprocessing
+import sys
+import urllib.request
+from array import array
+from collections import deque
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+import aiohttp
+from aiohttp import web
+import logging
+import logging.handlers
+import threading
+import traceback
+import weakref
+import asyncio
+import transcript_render
+
+# ------------------------
+# Metrics
+# ------------------------
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Metrics:
+    """In-process counters, gauges and latency histograms, rendered in the
+    Prometheus text exposition format by the /metrics endpoint."""
+
+    def __init__(self):
+        self._kinds = {}  # name -> (type, help)
+        self._counters = {}  # name -> {labels: value}
+        self._histograms = {}  # name -> {labels: [per-bucket counts..., +Inf count, sum]}
+        self._gauges = {}  # name -> callable returning the current value
+
+    def describe(self, name: str, kind: str, help_text: str):
+        self._kinds[name] = (kind, help_text)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        series = self._counters.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        series = self._histograms.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        buckets = series.get(key)
+        if buckets is None:
+            buckets = series[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+        buckets[bisect_left(LATENCY_BUCKETS, value)] += 1
+        buckets[-1] += value
+
+    def gauge(self, name: str, help_text: str, fn, label: str = None):
+        """Register a gauge read at scrape time. With ``label``, fn returns {label value: value}."""
+        self.describe(name, "gauge", help_text)
+        self._gauges[name] = (fn, label)
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **labels):
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - started, status=status, **labels)
+
+    @staticmethod
+    def _labels(pairs) -> str:
+        if not pairs:
+            return ""
+        escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+        return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+    @staticmethod
+    def _value(value) -> str:
+        value = float(value)
+        if value != value:
+            return "NaN"
+        if value in (float("inf"), float("-inf")):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+
+    def _header(self, lines: list, name: str, default_kind: str):
+        kind, help_text = self._kinds.get(name, (default_kind, ""))
+        if help_text:
+            lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    def render(self) -> str:
+        lines = []
+        for name, (fn, label) in self._gauges.items():
+            self._header(lines, name, "gauge")
+            if label is None:
+                lines.append(f"{name} {self._value(fn())}")
+            else:
+                for label_value, value in fn().items():
+                    lines.append(f"{name}{self._labels(((label, label_value),))} {self._value(value)}")
+        for name, series in self._counters.items():
+            self._header(lines, name, "counter")
+            for key, value in series.items():
+                lines.append(f"{name}{self._labels(key)} {value}")
+        for name, series in self._histograms.items():
+            self._header(lines, name, "histogram")
+            for key, buckets in series.items():
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), buckets):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{self._labels(key + (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_count{self._labels(key)} {cumulative}")
+                lines.append(f"{name}_sum{self._labels(key)} {buckets[-1]}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+metrics.describe("bot_commands_total", "counter", "Slash commands handled")
+metrics.describe("bot_command_seconds", "histogram", "Slash command handler latency")
+metrics.describe("bot_components_total", "counter", "Component interactions handled, by route")
+metrics.describe("bot_component_seconds", "histogram", "Component interaction handler latency")
+metrics.describe("bot_component_rejected_total", "counter", "Component interactions refused by a route check")
+metrics.describe("bot_http_429_total", "counter", "HTTP 429 responses received from Discord")
+metrics.describe("bot_event_loop_lag_seconds", "histogram", "Event loop scheduling delay")
+
+class CommandTree(discord.app_commands.CommandTree):
+    """Command tree that times every slash command it runs."""
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        interaction.extras["started"] = time.perf_counter()
+        if interaction.command is not None:
+            label_task(f"/{interaction.command.qualified_name}")
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: discord.app_commands.AppCommandError):
+        record_command(interaction, "error")
+        await super().on_error(interaction, error)
+
+def record_command(interaction: discord.Interaction, status: str):
+    started = interaction.extras.get("started")
+    command = interaction.command.qualified_name if interaction.command else "unknown"
+    metrics.inc("bot_commands_total", command=command, status=status)
+    if started is not None:
+        metrics.observe("bot_command_seconds", time.perf_counter() - started, command=command, status=status)
+
+class RateLimitCounter(logging.Handler):
+    """Counts the 429 warnings discord.py logs while it handles rate limits."""
+
+    def emit(self, record: logging.LogRecord):
+        if isinstance(record.msg, str) and record.msg.startswith("We are being rate limited"):
+            metrics.inc("bot_http_429_total", scope="route")
+        elif isinstance(record.msg, str) and record.msg.startswith("Global rate limit has been hit"):
+            metrics.inc("bot_http_429_total", scope="global")
+
+logging.getLogger("discord.http").addHandler(RateLimitCounter(logging.WARNING))
+
+
+# ------------------------
+# Discord Bot Setup
+# ------------------------
+intents = discord.Intents.default()
+intents.message_content = True
+intents.guilds = True
+intents.members = True
+
+# "lean" keeps only what the welcomer and ticket/giveaway paths use: no member
+# cache beyond the bot itself, no member chunking at startup and a small (by
+# default disabled) message cache. Handlers work from event payloads instead.
+CACHE_PROFILE = os.getenv("BOT_CACHE_PROFILE", "default")
+LEAN_MAX_MESSAGES = int(os.getenv("LEAN_MAX_MESSAGES", "0"))
+
+if CACHE_PROFILE == "lean":
+    cache_options = {
+        "member_cache_flags": discord.MemberCacheFlags.none(),
+        "chunk_guilds_at_startup": False,
+        "max_messages": LEAN_MAX_MESSAGES or None,
+    }
+else:
+    cache_options = {}
+
+# Cluster workers are started by the supervisor (see "Cluster Mode") with the
+# shards they own; a plain `python main.py` runs every shard in one process.
+WORKER_ID = int(os.getenv("BOT_WORKER_ID", "0"))
+SHARD_IDS = [int(shard_id) for shard_id in os.getenv("BOT_SHARD_IDS", "").split(",") if shard_id]
+SHARD_COUNT = int(os.getenv("BOT_SHARD_COUNT", "0")) or None
+
+if SHARD_IDS:
+    bot = commands.AutoShardedBot(
+        command_prefix="!", intents=intents, tree_cls=CommandTree,
+        shard_ids=SHARD_IDS, shard_count=SHARD_COUNT, **cache_options
+    )
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents, tree_cls=CommandTree, **cache_options)
+
+def owns_guild(guild_id: int) -> bool:
+    """Whether this process's shards receive the guild's events."""
+    return not SHARD_IDS or (guild_id >> 22) % SHARD_COUNT in SHARD_IDS
+
+TICKET_CATEGORY_NAME = "TICKETS"
+LOG_CHANNEL_NAME = "ticket-logs"  # where transcripts go
+SUPPORT_ROLE_NAME = "Support Team"  # role that sees all tickets
+
+
+# ------------------------
+# Health + Metrics Server
+# ------------------------
+HEALTH_HOST = "0.0.0.0"
+HEALTH_PORT = int(os.getenv("HEALTH_PORT", "8080")) + WORKER_ID  # one port per cluster worker
+LOOP_LAG_INTERVAL = 0.5  # seconds between event loop lag probes
+HEALTH_MAX_LOOP_LAG = 5.0  # /health reports unhealthy above this lag
+
+health = {"started": time.monotonic(), "loop_lag": 0.0}
+
+def seconds_since_last_receive() -> float | None:
+    """Age of the freshest gateway frame, read from each socket's keep-alive
+    timer so nothing has to be dispatched per event to track it."""
+    if isinstance(bot, commands.AutoShardedBot):
+        sockets = [shard._parent.ws for shard in bot.shards.values()]
+    else:
+        sockets = [bot.ws]
+    stamps = [ws._keep_alive._last_recv for ws in sockets if ws is not None and ws._keep_alive is not None]
+    return round(time.perf_counter() - max(stamps), 3) if stamps else None
+
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    record_command(interaction, "ok")
+
+async def monitor_loop_lag():
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + LOOP_LAG_INTERVAL
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        lag = max(0.0, loop.time() - expected)
+        health["loop_lag"] = lag
+        metrics.observe("bot_event_loop_lag_seconds", lag)
+
+async def handle_root(request: web.Request):
+    return web.Response(text="✅ Bot is running!")
+
+async def handle_health(request: web.Request):
+    now = time.monotonic()
+    latency = bot.latency
+    connected = bot.is_ready() and not bot.is_closed() and latency == latency and latency != float("inf")
+    healthy = connected and health["loop_lag"] < HEALTH_MAX_LOOP_LAG
+    body = {
+        "status": "ok" if healthy else "unhealthy",
+        "gateway_connected": connected,
+        "gateway_latency_seconds": latency if connected else None,
+        "seconds_since_last_event": seconds_since_last_receive(),
+        "event_loop_lag_seconds": round(health["loop_lag"], 4),
+        "uptime_seconds": round(now - health["started"], 1),
+        "startup_seconds": health.get("ready_seconds"),
+    }
+    return web.json_response(body, status=200 if healthy else 503)
+
+async def handle_metrics(request: web.Request):
+    return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
+async def start_health_server():
+    """Serve /, /health and /metrics from the bot's own event loop."""
+    app = web.Application()
+    app.router.add_get("/", handle_root)
+    app.router.add_get("/health", handle_health)
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, HEALTH_HOST, HEALTH_PORT).start()
+    asyncio.create_task(monitor_loop_lag())
+    print(f"✅ Health server listening on port {HEALTH_PORT}")
+
+metrics.gauge("bot_gateway_latency_seconds", "Gateway heartbeat latency", lambda: bot.latency)
+metrics.gauge("bot_guilds", "Guilds the bot is in", lambda: len(bot.guilds))
+
+
+# ------------------------
+# Event Loop Watchdog
+# ------------------------
+WATCHDOG_THRESHOLD = float(os.getenv("WATCHDOG_THRESHOLD", "0.25"))  # seconds; 0 disables the watchdog
+WATCHDOG_INTERVAL = 0.05  # heartbeat period on the loop and poll period of the watchdog thread
+WATCHDOG_LOG = os.getenv("WATCHDOG_LOG", "loop_stalls.log" if not WORKER_ID else f"loop_stalls.w{WORKER_ID}.log")
+WATCHDOG_LOG_BYTES = 1024 * 1024
+WATCHDOG_LOG_BACKUPS = 3
+WATCHDOG_STACK_DEPTH = 30
+WATCHDOG_RECENT = 50  # stalls kept in memory for /loop_stalls
+
+task_labels = weakref.WeakKeyDictionary()  # task -> slash command or custom_id it is handling
+
+def label_task(label: str):
+    """Attribute the current task, and every task it starts, to ``label``."""
+    task = asyncio.current_task()
+    if task is not None:
+        task_labels[task] = label
+
+def labelling_task_factory(loop, coro, **kwargs):
+    task = asyncio.Task(coro, loop=loop, **kwargs)
+    parent = asyncio.current_task(loop)
+    if parent is not None and parent in task_labels:
+        task_labels[task] = task_labels[parent]
+    return task
+
+class LoopWatchdog:
+    """Finds out what is blocking the event loop when it stalls.
+
+    A heartbeat callback on the loop stamps the time every WATCHDOG_INTERVAL
+    and a daemon thread watches that stamp. Once the loop runs late, the
+    thread grabs the loop thread's stack with sys._current_frames() and the
+    label of the running task. When the heartbeat runs again, a stall longer
+    than WATCHDOG_THRESHOLD is recorded with that sample in the rotating log,
+    the metrics and the /loop_stalls summary. A healthy loop costs one
+    callback and one thread wakeup per interval.
+    """
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.recent = deque(maxlen=WATCHDOG_RECENT)
+        self.by_label = {}  # label -> {"count", "total", "max", "where"}
+        self._loop = None
+        self._loop_thread = None
+        self._due = None  # monotonic time the next heartbeat should run
+        self._sample = None  # (label, stack) captured during the current stall
+        self._log = logging.getLogger("bot.watchdog")
+
+    def start(self):
+        if not self.threshold or self._loop is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        if self._loop.get_task_factory() is None:
+            self._loop.set_task_factory(labelling_task_factory)
+        handler = logging.handlers.RotatingFileHandler(
+            WATCHDOG_LOG, maxBytes=WATCHDOG_LOG_BYTES, backupCount=WATCHDOG_LOG_BACKUPS, encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        self._log.addHandler(handler)
+        self._log.setLevel(logging.INFO)
+        self._log.propagate = False
+        self._due = time.monotonic() + WATCHDOG_INTERVAL
+        self._loop.call_later(WATCHDOG_INTERVAL, self._heartbeat)
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    def _heartbeat(self):
+        now = time.monotonic()
+        late = now - self._due
+        sample, self._sample = self._sample, None
+        if late >= self.threshold:
+            self._record(late, sample or ("unknown", []))
+        self._due = now + WATCHDOG_INTERVAL
+        self._loop.call_later(WATCHDOG_INTERVAL, self._heartbeat)
+
+    def _watch(self):
+        while True:
+            time.sleep(WATCHDOG_INTERVAL)
+            # Sample halfway to the threshold so even a stall that barely crosses it
+            # is caught in the act; the heartbeat drops samples of shorter stalls
+            if self._sample is None and time.monotonic() - self._due >= self.threshold / 2:
+                self._sample = self._capture()
+
+    def _capture(self):
+        frame = sys._current_frames().get(self._loop_thread)
+        try:
+            task = asyncio.current_task(self._loop)
+        except RuntimeError:
+            task = None
+        if task is None:
+            label = "callback"  # a plain loop callback, e.g. gateway parsing
+        else:
+            label = task_labels.get(task) or task.get_name()
+        stack = traceback.format_stack(frame, limit=WATCHDOG_STACK_DEPTH) if frame is not None else []
+        return label, stack
+
+    def _record(self, seconds: float, sample):
+        label, stack = sample
+        where = stack[-1].strip().splitlines()[0] if stack else "unknown"
+        self.recent.append({"at": time.time(), "seconds": seconds, "label": label, "where": where})
+        stats = self.by_label.setdefault(label, {"count": 0, "total": 0.0, "max": 0.0, "where": where})
+        stats["count"] += 1
+        stats["total"] += seconds
+        if seconds >= stats["max"]:
+            stats["max"] = seconds
+            stats["where"] = where
+        metrics.inc("bot_loop_stalls_total", label=label)
+        metrics.observe("bot_loop_stall_seconds", seconds)
+        print(f"⚠️ Event loop blocked for {seconds:.2f}s in {label}: {where}")
+        self._log.info("stall %.3fs in %s\n%s", seconds, label, "".join(stack).rstrip())
+
+loop_watchdog = LoopWatchdog(WATCHDOG_THRESHOLD)
+
+metrics.describe("bot_loop_stalls_total", "counter", "Event loop stalls over the watchdog threshold, by handler")
+metrics.describe("bot_loop_stall_seconds", "histogram", "Length of event loop stalls over the watchdog threshold")
+
+@bot.tree.command(name="loop_stalls", description="Show what has been blocking the bot's event loop")
+@discord.app_commands.default_permissions(administrator=True)
+async def loop_stalls(interaction: discord.Interaction):
+    if not loop_watchdog.by_label:
+        await interaction.response.send_message("✅ No event loop stalls recorded since startup.", ephemeral=True)
+        return
+
+    embed = discord.Embed(
+        title="⏱️ Event Loop Stalls",
+        description=f"Stalls over {WATCHDOG_THRESHOLD:g}s since startup, worst offenders first.",
+        color=discord.Color.orange()
+    )
+    worst = sorted(loop_watchdog.by_label.items(), key=lambda item: item[1]["total"], reverse=True)
+    for label, stats in worst[:10]:
+        embed.add_field(
+            name=label[:256],
+            value=f"{stats['count']}× · {stats['total']:.2f}s total · {stats['max']:.2f}s max\n`{stats['where'][:200]}`",
+            inline=False
+        )
+    recent = "\n".join(
+        f"<t:{int(stall['at'])}:T> {stall['seconds']:.2f}s in {stall['label']}" for stall in list(loop_watchdog.recent)[-5:]
+    )
+    embed.add_field(name="Most recent", value=recent[:1024], inline=False)
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+# ------------------------
+# Outbound Scheduler
+# ------------------------
+PRIORITY_INTERACTION = 0  # interaction followups
+PRIORITY_TICKET = 1  # ticket channels, greetings, transcripts
+PRIORITY_ANNOUNCEMENT = 2  # giveaway results, welcome/leave embeds, background upkeep
+PRIORITY_NAMES = ("interaction", "ticket", "announcement")
+
+OUTBOUND_CONCURRENCY = int(os.getenv("OUTBOUND_CONCURRENCY", "8"))  # requests in flight at once
+# Slots only interaction followups may use. A ticket or announcement request holds its slot
+# through discord.py's own 429 waits and whole transcript uploads, so without these a burst
+# of them could starve the followups.
+OUTBOUND_INTERACTION_SLOTS = max(1, OUTBOUND_CONCURRENCY // 4)
+# In-flight cap per class; tickets and announcements together stay below the reserved slots
+OUTBOUND_CLASS_LIMITS = (
+    OUTBOUND_CONCURRENCY,
+    max(1, OUTBOUND_CONCURRENCY - OUTBOUND_INTERACTION_SLOTS),
+    max(1, OUTBOUND_CONCURRENCY // 2),
+)
+# (requests, per seconds) per route, kept under Discord's own buckets so we queue instead of hitting 429s
+OUTBOUND_ROUTE_LIMITS = {
+    "channel": (5, 5.0),
+}
+
+class OutboundRequest:
+    __slots__ = ("priority", "seq", "route", "call", "futures", "coalesce", "queued_at")
+
+    def __init__(self, priority, seq, route, call, coalesce):
+        self.priority = priority
+        self.seq = seq
+        self.route = route
+        self.call = call
+        self.futures = []
+        self.coalesce = coalesce
+        self.queued_at = time.perf_counter()
+
+class OutboundScheduler:
+    """Every request the bot makes to Discord, sent in priority order.
+
+    Requests are queued per route (a channel, a guild, a ticket being
+    opened, an interaction webhook) and run one at a time per route, so
+    messages in a channel keep their order. Across routes the highest
+    priority class goes first, at most OUTBOUND_CONCURRENCY requests are in
+    flight with OUTBOUND_INTERACTION_SLOTS of them kept for interactions,
+    and rate-limited routes wait for their window instead of spending a
+    429. A request
+    submitted with a coalesce key replaces a queued one with the same key,
+    e.g. a newer edit of the same message.
+    """
+
+    def __init__(self):
+        self._seq = 0
+        self._routes = {}  # route -> heap of (priority, seq, request)
+        self._ready = []  # heap of (priority, seq, route) for route heads that may be runnable
+        self._waiting = []  # heap of (loop time, route) for routes held back by their rate limit
+        self._busy = set()  # routes with a request in flight
+        self._sent = {}  # rate-limited route -> deque of recent send times
+        self._coalescing = {}  # coalesce key -> queued request
+        self.depth = [0] * len(PRIORITY_NAMES)
+        self.in_flight = [0] * len(PRIORITY_NAMES)
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def submit(self, priority: int, route: tuple, call, coalesce=None) -> asyncio.Future:
+        """Queue ``call`` (a function returning a coroutine); await the result for its outcome."""
+        future = asyncio.get_running_loop().create_future()
+        queued = self._coalescing.get(coalesce) if coalesce is not None else None
+        if queued is not None:
+            queued.call = call
+            queued.futures.append(future)
+            metrics.inc("bot_outbound_coalesced_total", priority=PRIORITY_NAMES[queued.priority])
+            return future
+
+        self._seq += 1
+        request = OutboundRequest(priority, self._seq, route, call, coalesce)
+        request.futures.append(future)
+        heapq.heappush(self._routes.setdefault(route, []), (priority, request.seq, request))
+        if coalesce is not None:
+            self._coalescing[coalesce] = request
+        self.depth[priority] += 1
+        self._push_head(route)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return future
+
+    def send(self, priority: int, channel: discord.abc.Messageable, *args, **kwargs) -> asyncio.Future:
+        return self.submit(priority, ("channel", channel.id), lambda: channel.send(*args, **kwargs))
+
+    def _push_head(self, route: tuple):
+        queue = self._routes.get(route)
+        if queue:
+            priority, seq, _ = queue[0]
+            heapq.heappush(self._ready, (priority, seq, route))
+            self._wakeup.set()
+
+    def _free_at(self, route: tuple, now: float) -> float:
+        limit = OUTBOUND_ROUTE_LIMITS.get(route[0])
+        sent = self._sent.get(route)
+        if limit is None or sent is None or len(sent) < limit[0]:
+            return now
+        return sent[0] + limit[1]
+
+    def _next(self):
+        loop_now = asyncio.get_running_loop().time()
+        while self._waiting and self._waiting[0][0] <= loop_now:
+            self._push_head(heapq.heappop(self._waiting)[1])
+        if sum(self.in_flight) >= OUTBOUND_CONCURRENCY:
+            return None
+
+        held = []
+        request = None
+        while self._ready:
+            entry = heapq.heappop(self._ready)
+            priority, seq, route = entry
+            queue = self._routes.get(route)
+            if not queue or queue[0][1] != seq or route in self._busy:
+                continue  # stale: the head changed, or it is re-queued when the route frees up
+            if self.in_flight[priority] >= OUTBOUND_CLASS_LIMITS[priority] or (
+                    priority != PRIORITY_INTERACTION
+                    and sum(self.in_flight) - self.in_flight[PRIORITY_INTERACTION] >= OUTBOUND_CONCURRENCY - OUTBOUND_INTERACTION_SLOTS):
+                held.append(entry)
+                continue
+            free_at = self._free_at(route, loop_now)
+            if free_at > loop_now:
+                heapq.heappush(self._waiting, (free_at, route))
+                continue
+            request = heapq.heappop(queue)[2]
+            if not queue:
+                del self._routes[route]
+            break
+        for entry in held:
+            heapq.heappush(self._ready, entry)
+        return request
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wakeup.clear()
+            request = self._next()
+            if request is None:
+                timeout = self._waiting[0][0] - loop.time() if self._waiting else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._start(request, loop.time())
+
+    def _start(self, request: OutboundRequest, loop_now: float):
+        self.depth[request.priority] -= 1
+        if request.coalesce is not None:
+            self._coalescing.pop(request.coalesce, None)
+        if all(future.done() for future in request.futures):
+            self._push_head(request.route)  # every caller gave up (cancelled); skip it
+            return
+
+        priority = PRIORITY_NAMES[request.priority]
+        metrics.observe("bot_outbound_wait_seconds", time.perf_counter() - request.queued_at, priority=priority)
+        limit = OUTBOUND_ROUTE_LIMITS.get(request.route[0])
+        if limit is not None:
+            sent = self._sent.get(request.route)
+            if sent is None:
+                sent = self._sent[request.route] = deque(maxlen=limit[0])
+            sent.append(loop_now)
+        self._busy.add(request.route)
+        self.in_flight[request.priority] += 1
+        asyncio.create_task(self._execute(request))
+
+    async def _execute(self, request: OutboundRequest):
+        try:
+            result = await request.call()
+        except Exception as e:
+            for future in request.futures:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for future in request.futures:
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._busy.discard(request.route)
+            self.in_flight[request.priority] -= 1
+            self._forget_idle(request.route)
+            self._push_head(request.route)
+            self._wakeup.set()
+
+    def _forget_idle(self, route: tuple):
+        # Drop a route's rate-limit history once its window has passed with nothing queued
+        limit = OUTBOUND_ROUTE_LIMITS.get(route[0])
+        if limit is not None and route not in self._routes:
+            asyncio.get_running_loop().call_later(limit[1], self._expire, route)
+
+    def _expire(self, route: tuple):
+        sent = self._sent.get(route)
+        if sent is None or route in self._routes or route in self._busy:
+            return
+        if sent[-1] <= asyncio.get_running_loop().time() - OUTBOUND_ROUTE_LIMITS[route[0]][1]:
+            del self._sent[route]
+
+outbound = OutboundScheduler()
+
+metrics.describe("bot_outbound_coalesced_total", "counter", "Outbound requests merged into an already queued one")
+metrics.describe("bot_outbound_wait_seconds", "histogram", "Time outbound requests spent queued")
+metrics.gauge("bot_outbound_queue_depth", "Outbound requests waiting to be sent",
+              lambda: dict(zip(PRIORITY_NAMES, outbound.depth)), label="priority")
+metrics.gauge("bot_outbound_in_flight", "Outbound requests being sent",
+              lambda: dict(zip(PRIORITY_NAMES, outbound.in_flight)), label="priority")
+
+
+# ------------------------
+# Deferred Interaction Jobs
+# ------------------------
+JOB_CONCURRENCY_PER_GUILD = int(os.getenv("JOB_CONCURRENCY_PER_GUILD", "4"))
+
+metrics.describe("bot_job_seconds", "histogram", "Deferred interaction job latency")
+metrics.describe("bot_job_step_seconds", "histogram", "Latency of each step inside a deferred job")
+
+class Job:
+    """One deferred interaction handler; delivers results through followups."""
+
+    def __init__(self, interaction: discord.Interaction, name: str, ephemeral: bool):
+        self.interaction = interaction
+        self.name = name
+        self.ephemeral = ephemeral
+
+    def step(self, step: str):
+        """Time one step of the job, e.g. ``with job.step("create_channel"):``."""
+        return metrics.timer("bot_job_step_seconds", job=self.name, step=step)
+
+    async def reply(self, content: str = None, *, ephemeral: bool = None, **kwargs):
+        ephemeral = self.ephemeral if ephemeral is None else ephemeral
+        return await outbound.submit(
+            PRIORITY_INTERACTION, ("webhook", self.interaction.id),
+            lambda: self.interaction.followup.send(content, ephemeral=ephemeral, **kwargs)
+        )
+
+class InteractionJobs:
+    """Acknowledges interactions immediately and runs their bodies in the background.
+
+    Jobs are tracked until they finish and at most JOB_CONCURRENCY_PER_GUILD
+    run at once per guild; the rest queue on that guild's semaphore. Jobs of a
+    button route with its own limit queue on the route's slot instead.
+    """
+
+    def __init__(self):
+        self.running = set()
+        self._semaphores = {}  # guild_id -> asyncio.Semaphore
+
+    async def dispatch(self, interaction: discord.Interaction, name: str, handler, *, ephemeral: bool = True):
+        if not interaction.response.is_done():
+            await interaction.response.defer(ephemeral=ephemeral, thinking=True)
+        task = asyncio.create_task(self._run(Job(interaction, name, ephemeral), handler))
+        self.running.add(task)
+        task.add_done_callback(self.running.discard)
+        return task
+
+    async def _run(self, job: Job, handler):
+        guild_id = job.interaction.guild_id or 0
+        if guild_id not in self._semaphores:
+            self._semaphores[guild_id] = asyncio.Semaphore(JOB_CONCURRENCY_PER_GUILD)
+        try:
+            async with job.interaction.extras.get("slot") or self._semaphores[guild_id]:
+                with metrics.timer("bot_job_seconds", job=job.name):
+                    await handler(job)
+        except Exception as e:
+            print(f"❌ Job {job.name} failed: {e}")
+            try:
+                await job.reply(f"❌ Something went wrong: {e}", ephemeral=True)
+            except discord.HTTPException:
+                pass
+
+interaction_jobs = InteractionJobs()
+metrics.gauge("bot_jobs_running", "Deferred interaction jobs in progress", lambda: len(interaction_jobs.running))
+
+
+# ------------------------
+# Persistent State (SQLite)
+# ------------------------
+STATE_DB = os.getenv("STATE_DB", "bot_state.db")
+
+class StateStore:
+    """Local SQLite database shared by the bot's persistent subsystems.
+
+    The database runs in WAL mode and every statement goes through a single
+    worker thread, so writes never block the event loop and are applied in
+    the order they were submitted.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.schema = []
+        self._conn = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="state-db")
+
+    def add_schema(self, sql: str):
+        self.schema.append(sql)
+
+    def _connect(self):
+        if self._conn is None:
+            # Cluster workers share the file; wait for another process's write lock instead of failing
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                for sql in self.schema:
+                    conn.executescript(sql)
+            self._conn = conn
+        return self._conn
+
+    def run_sync(self, fn, *args):
+        return self._executor.submit(lambda: fn(self._connect(), *args)).result()
+
+    async def run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: fn(self._connect(), *args))
+
+    async def get_meta(self, key: str):
+        def read(conn):
+            row = conn.execute("SELECT value FROM bot_meta WHERE key = ?", (key,)).fetchone()
+            return row[0] if row else None
+        return await self.run(read)
+
+    async def set_meta(self, key: str, value: str):
+        def write(conn):
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO bot_meta VALUES (?, ?)", (key, value))
+        await self.run(write)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+class WriteBehind:
+    """Buffers changed keys in memory and writes them back in batches.
+
+    ``mark`` records a change; ``delay`` seconds after the first one, or as
+    soon as ``batch`` keys are pending, ``collect(keys)`` turns them into the
+    arguments for ``write(conn, ...)``, which runs as one executor call. If a
+    write fails the keys are marked again and retried after another delay,
+    so a busy or locked database never drops changes.
+    """
+
+    def __init__(self, db: StateStore, name: str, delay: float, collect, write, batch: int = None):
+        self.db = db
+        self.name = name
+        self.delay = delay
+        self.collect = collect
+        self.write = write
+        self.batch = batch
+        self._dirty = set()
+        self._flush_task = None
+        self._tasks = set()  # batch flushes in progress
+
+    def __len__(self):
+        return len(self._dirty)
+
+    def mark(self, key):
+        self._dirty.add(key)
+        if self.batch is not None and len(self._dirty) >= self.batch:
+            task = asyncio.create_task(self.flush())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    def drop(self, predicate):
+        """Forget pending keys that no longer need writing."""
+        self._dirty = {key for key in self._dirty if not predicate(key)}
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.delay)
+        self._flush_task = None
+        await self.flush()
+
+    def _take(self):
+        keys, self._dirty = self._dirty, set()
+        return keys
+
+    def _failed(self, keys: set, error: Exception):
+        print(f"❌ Failed to write {len(keys)} {self.name} change(s), will retry: {error}")
+        self._dirty |= keys
+
+    async def flush(self):
+        keys = self._take()
+        if not keys:
+            return
+        try:
+            await self.db.run(self.write, *self.collect(keys))
+        except Exception as e:
+            self._failed(keys, e)
+            if self._flush_task is None:
+                self._flush_task = asyncio.create_task(self._flush_later())
+
+    def flush_sync(self):
+        keys = self._take()
+        if not keys:
+            return
+        try:
+            self.db.run_sync(self.write, *self.collect(keys))
+        except Exception as e:
+            self._failed(keys, e)
+
+state_db = StateStore(STATE_DB)
+state_db.add_schema("""
+CREATE TABLE IF NOT EXISTS bot_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+""")
+
+
+@bot.event
+async def on_ready():
+    # Ready fires again after every reconnect; only the first one is startup
+    if health.get("ready_seconds") is None:
+        health["ready_seconds"] = time.monotonic() - health["started"]
+        print(f"✅ Logged in as {bot.user} (ready in {health['ready_seconds']:.1f}s)")
+    else:
+        print(f"🔁 Reconnected as {bot.user}")
+
+
+# ------------------------
+# Component Router
+# ------------------------
+class ComponentRoute:
+    def __init__(self, name: str, handler, checks: tuple, limit: int):
+        self.name = name  # metrics label; prefix routes share one
+        self.handler = handler
+        self.checks = checks
+        self.limit = limit
+
+class ComponentRouter:
+    """Maps button custom_ids to their handlers.
+
+    Exact IDs cost one dict lookup; prefix routes such as ``enter_giveaway_<id>``
+    one lookup per distinct prefix length. A route's checks run before its
+    handler and return an error message to refuse the click. ``limit`` caps how
+    many of the route's deferred jobs run at once per guild; routes sharing a
+    handler share the cap, and without one a route's jobs queue on the guild's
+    JOB_CONCURRENCY_PER_GUILD slots.
+    """
+
+    def __init__(self):
+        self.exact = {}  # custom_id -> route
+        self.prefixes = {}  # custom_id prefix -> route
+        self._prefix_lengths = []  # longest first, so the most specific prefix wins
+        self._slots = {}  # (guild_id, handler) -> asyncio.Semaphore
+
+    def add(self, custom_id: str, handler, *, prefix: bool = False, name: str = None, checks: tuple = (), limit: int = None):
+        route = ComponentRoute(name or custom_id, handler, checks, limit)
+        if prefix:
+            self.prefixes[custom_id] = route
+            self._prefix_lengths = sorted({len(p) for p in self.prefixes}, reverse=True)
+        else:
+            self.exact[custom_id] = route
+
+    def match(self, custom_id: str):
+        """Return ``(route, argument)``; the argument is the part after a matched prefix."""
+        route = self.exact.get(custom_id)
+        if route is not None:
+            return route, custom_id
+        for length in self._prefix_lengths:
+            route = self.prefixes.get(custom_id[:length])
+            if route is not None:
+                return route, custom_id[length:]
+        return None, None
+
+    async def dispatch(self, interaction: discord.Interaction):
+        route, argument = self.match(interaction.data["custom_id"])
+        if route is None:
+            print(f"⚠️ No route for button {interaction.data['custom_id']!r}")
+            return
+        label_task(route.name)
+        for check in route.checks:
+            error = check(interaction)
+            if error is not None:
+                metrics.inc("bot_component_rejected_total", custom_id=route.name, check=check.__name__)
+                await interaction.response.send_message(error, ephemeral=True)
+                return
+        if route.limit is not None:
+            # Picked up by InteractionJobs when the handler defers its work
+            key = (interaction.guild_id or 0, route.handler)
+            if key not in self._slots:
+                self._slots[key] = asyncio.Semaphore(route.limit)
+            interaction.extras["slot"] = self._slots[key]
+        metrics.inc("bot_components_total", custom_id=route.name)
+        with metrics.timer("bot_component_seconds", custom_id=route.name):
+            await route.handler(interaction, argument)
+
+component_router = ComponentRouter()
+
+class RoutedButton(Button):
+    """A button whose clicks are handled by component_router."""
+
+    async def callback(self, interaction: discord.Interaction):
+        await component_router.dispatch(interaction)
+
+
+# ------------------------
+# Ticket Panel Command
+# ------------------------
+class TicketPanelView(View):
+    def __init__(self):
+        super().__init__(timeout=None)
+        self.add_item(RoutedButton(label="📕 Support", style=discord.ButtonStyle.danger, custom_id="support"))
+        self.add_item(RoutedButton(label="🛒 Purchase", style=discord.ButtonStyle.success, custom_id="purchase"))
+
+@bot.tree.command(name="ticketpanel", description="Send the ticket creation panel")
+async def ticketpanel(interaction: discord.Interaction):
+    embed = discord.Embed(
+        title="🎫 Ramirez Official Ticket Hub",
+        description="Need assistance or looking to make a purchase?\n\n"
+                    "📕 **Support Ticket** - For bot issues, bugs, questions.\n"
+                    "🛒 **Purchase Ticket** - For purchases, pricing, or custom items.\n\n"
+                    "Click a button below to create your ticket.",
+        color=discord.Color.blurple()
+    )
+
+    await interaction.response.send_message(embed=embed, view=TicketPanelView())
+
+
+# ------------------------
+# Giveaway System
+# ------------------------
+import random
+import secrets
+from itertools import accumulate
+
+active_giveaways = {}  # Store active giveaways
+metrics.gauge("bot_active_giveaways", "Giveaways that have not ended yet", lambda: len(active_giveaways))
+
+GIVEAWAY_ENTRY_BATCH = 500  # entries written per transaction
+GIVEAWAY_ENTRY_FLUSH_SECONDS = 1.0  # max time an entry waits before it is written
+GIVEAWAY_MAX_BONUS_ENTRIES = 100
+
+state_db.add_schema("""
+CREATE TABLE IF NOT EXISTS giveaways (
+    id TEXT PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    message_id INTEGER,
+    host_id INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL,
+    winners INTEGER NOT NULL,
+    end_time REAL NOT NULL,
+    seed INTEGER NOT NULL,
+    bonus_role_id INTEGER,
+    bonus_entries INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS giveaway_entries (
+    giveaway_id TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    weight INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (giveaway_id, user_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS giveaway_archive (
+    id TEXT PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    message_id INTEGER,
+    host_id INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL,
+    winners INTEGER NOT NULL,
+    ended_at REAL NOT NULL,
+    participants BLOB NOT NULL,  -- packed uint64 user IDs, in draw order
+    winner_ids BLOB NOT NULL,    -- packed uint64 user IDs of the latest draw
+    seed INTEGER NOT NULL,
+    weights BLOB NOT NULL        -- packed uint32 entry counts, parallel to participants
+);
+CREATE TABLE IF NOT EXISTS giveaway_draws (
+    giveaway_id TEXT NOT NULL,
+    draw INTEGER NOT NULL,       -- 0 is the original draw, then one per reroll
+    seed INTEGER NOT NULL,
+    drawn_at REAL NOT NULL,
+    drawn_by INTEGER,            -- NULL when the giveaway ended on schedule
+    entrants INTEGER NOT NULL,
+    total_weight INTEGER NOT NULL,
+    winner_ids BLOB NOT NULL,
+    PRIMARY KEY (giveaway_id, draw)
+);
+""")
+
+def pack_ids(ids) -> bytes:
+    return array("Q", ids).tobytes()
+
+def unpack_ids(blob: bytes) -> array:
+    ids = array("Q")
+    ids.frombytes(blob)
+    return ids
+
+EMBED_FIELD_LIMIT = 1024  # Discord's limit on one embed field's value
+EMBED_DESCRIPTION_LIMIT = 4096  # on an embed's description
+EMBED_TOTAL_LIMIT = 6000  # and on all of an embed's text together
+MESSAGE_CONTENT_LIMIT = 2000  # Discord's limit on a message's text
+
+def format_mentions(user_ids, limit: int) -> str:
+    """Mention users, comma separated, ending in "and N more" if the list doesn't fit in ``limit`` characters."""
+    text = ""
+    for index, user_id in enumerate(user_ids):
+        candidate = f"{text}, <@{user_id}>" if text else f"<@{user_id}>"
+        rest = len(user_ids) - index - 1
+        # Only take a mention if the "and N more" for the rest would still fit after it
+        if len(candidate) + (len(f", and {rest} more") if rest else 0) > limit:
+            return f"{text}, and {len(user_ids) - index} more" if text else f"{len(user_ids)} winners"
+        text = candidate
+    return text
+
+def new_giveaway_seed() -> int:
+    return secrets.randbits(63)  # fits SQLite's signed 64-bit INTEGER
+
+class GiveawayEntries:
+    """A giveaway's entrants in entry order, with the number of entries each holds.
+
+    IDs and weights live in parallel typed arrays, 12 bytes per entrant, and
+    are the exact input of a draw. The set used to reject duplicate entries
+    is only built for running giveaways.
+    """
+
+    def __init__(self, ids=(), weights=None):
+        self.ids = array("Q", ids)
+        self.weights = array("I", weights) if weights is not None else array("I", [1]) * len(self.ids)
+        self._seen = None
+
+    def add(self, user_id: int, weight: int = 1):
+        if self._seen is None:
+            self._seen = set(self.ids)
+        self._seen.add(user_id)
+        self.ids.append(user_id)
+        self.weights.append(weight)
+
+    def __contains__(self, user_id: int) -> bool:
+        if self._seen is None:
+            self._seen = set(self.ids)
+        return user_id in self._seen
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def total_weight(self) -> int:
+        return sum(self.weights)
+
+def draw_winners(entries: GiveawayEntries, count: int, seed: int, draw: int) -> list:
+    """Draw up to ``count`` distinct winners, weighted by entries, reproducibly.
+
+    Each pick is proportional to weight among the entrants not yet picked.
+    Cumulative weights live in a Fenwick tree, so the draw costs O(n) to set
+    up plus O(log n) per winner, and no copy of the entrants is made. The
+    random stream depends only on the giveaway seed and the draw number, so
+    re-running a draw over the archived entries gives the same winners.
+    """
+    n = len(entries)
+    weights = entries.weights
+    prefix = [0, *accumulate(weights)]
+    # Node i holds the sum of the (i & -i) weights ending at position i
+    tree = [prefix[i] - prefix[i & (i - 1)] for i in range(n + 1)]
+    total = prefix[-1]
+    rng = random.Random(f"{seed}:{draw}")
+    top = 1 << n.bit_length() if n else 0
+    winners = []
+    while len(winners) < count and total > 0:
+        target = rng.randrange(total)
+        # Descend to the entrant whose cumulative weight range contains target
+        pos, step = 0, top
+        while step:
+            nxt = pos + step
+            if nxt <= n and tree[nxt] <= target:
+                pos = nxt
+                target -= tree[nxt]
+            step >>= 1
+        weight = weights[pos]
+        winners.append(entries.ids[pos])
+        total -= weight
+        i = pos + 1
+        while i <= n:
+            tree[i] -= weight
+            i += i & -i
+    return winners
+
+class GiveawayStore:
+    """Persists running giveaways and their entries to the state database.
+
+    Entries are buffered and written in batches, either once GIVEAWAY_ENTRY_BATCH
+    are pending or GIVEAWAY_ENTRY_FLUSH_SECONDS after the first one arrived.
+    """
+
+    def __init__(self, db: StateStore):
+        self.db = db
+        self._entries = WriteBehind(
+            db, "giveaway entry", GIVEAWAY_ENTRY_FLUSH_SECONDS,
+            lambda entries: (list(entries),), self._write_entries, batch=GIVEAWAY_ENTRY_BATCH
+        )
+
+    async def save(self, giveaway_id: str, giveaway: dict):
+        row = (
+            giveaway_id, giveaway["guild_id"], giveaway["channel_id"], giveaway["message_id"],
+            giveaway["host"], giveaway["title"], giveaway["description"], giveaway["winners"],
+            giveaway["end_time"].timestamp(), giveaway["seed"], giveaway["bonus_role_id"], giveaway["bonus_entries"],
+        )
+        def write(conn):
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO giveaways (id, guild_id, channel_id, message_id, host_id, title, description,"
+                    " winners, end_time, seed, bonus_role_id, bonus_entries) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    row
+                )
+        await self.db.run(write)
+
+    def add_entry(self, giveaway_id: str, user_id: int, weight: int = 1):
+        self._entries.mark((giveaway_id, user_id, weight))
+
+    async def flush(self):
+        await self._entries.flush()
+
+    def flush_sync(self):
+        self._entries.flush_sync()
+
+    @staticmethod
+    def _write_entries(conn, batch):
+        with conn:
+            conn.executemany("INSERT OR IGNORE INTO giveaway_entries (giveaway_id, user_id, weight) VALUES (?, ?, ?)", batch)
+
+    async def delete(self, giveaway_id: str):
+        self._entries.drop(lambda entry: entry[0] == giveaway_id)
+        def write(conn):
+            with conn:
+                conn.execute("DELETE FROM giveaway_entries WHERE giveaway_id = ?", (giveaway_id,))
+                conn.execute("DELETE FROM giveaways WHERE id = ?", (giveaway_id,))
+        await self.db.run(write)
+
+    async def archive(self, giveaway_id: str, giveaway: dict, winners: list):
+        """Move an ended giveaway, its entries and its first draw into the archive."""
+        self._entries.drop(lambda entry: entry[0] == giveaway_id)
+        entries = giveaway["participants"]
+        row = (
+            giveaway_id, giveaway["guild_id"], giveaway["channel_id"], giveaway["message_id"],
+            giveaway["host"], giveaway["title"], giveaway["description"], giveaway["winners"],
+            time.time(), entries.ids.tobytes(), pack_ids(winners), giveaway["seed"], entries.weights.tobytes(),
+        )
+        def write(conn):
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO giveaway_archive (id, guild_id, channel_id, message_id, host_id, title,"
+                    " description, winners, ended_at, participants, winner_ids, seed, weights)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    row
+                )
+                if entries:
+                    self._insert_draw(conn, giveaway_id, 0, giveaway["seed"], None, entries, winners)
+                conn.execute("DELETE FROM giveaway_entries WHERE giveaway_id = ?", (giveaway_id,))
+                conn.execute("DELETE FROM giveaways WHERE id = ?", (giveaway_id,))
+        await self.db.run(write)
+
+    async def load_archived(self, giveaway_id: str):
+        """Return an ended giveaway by ID, or None if it was never archived."""
+        def read(conn):
+            return conn.execute(
+                "SELECT id, guild_id, channel_id, message_id, host_id, title, description, winners, ended_at,"
+                " participants, winner_ids, seed, weights FROM giveaway_archive WHERE id = ?",
+                (giveaway_id,)
+            ).fetchone()
+        row = await self.db.run(read)
+        if row is None:
+            return None
+        weights = array("I")
+        weights.frombytes(row[12])
+        return {
+            "title": row[5],
+            "description": row[6],
+            "winners": row[7],
+            "ended_at": datetime.fromtimestamp(row[8], timezone.utc),
+            "participants": GiveawayEntries(unpack_ids(row[9]), weights),
+            "winner_ids": unpack_ids(row[10]),
+            "seed": row[11],
+            "guild_id": row[1],
+            "channel_id": row[2],
+            "message_id": row[3],
+            "host": row[4],
+        }
+
+    async def reroll(self, giveaway_id: str, seed: int, drawn_by: int, entries: GiveawayEntries, count: int):
+        """Run the next numbered draw of an archived giveaway and make its winners the current ones.
+
+        The draw number is taken and the draw stored in one write transaction,
+        so concurrent rerolls, from this worker or another, get distinct numbers.
+        Returns ``(draw, winners)``.
+        """
+        def write(conn):
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                draw = conn.execute(
+                    "SELECT COALESCE(MAX(draw) + 1, 0) FROM giveaway_draws WHERE giveaway_id = ?", (giveaway_id,)
+                ).fetchone()[0]
+                winners = draw_winners(entries, count, seed, draw)
+                self._insert_draw(conn, giveaway_id, draw, seed, drawn_by, entries, winners)
+                conn.execute(
+                    "UPDATE giveaway_archive SET winner_ids = ? WHERE id = ?",
+                    (pack_ids(winners), giveaway_id)
+                )
+            return draw, winners
+        return await self.db.run(write)
+
+    @staticmethod
+    def _insert_draw(conn, giveaway_id, draw, seed, drawn_by, entries, winners):
+        conn.execute(
+            "INSERT INTO giveaway_draws VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (giveaway_id, draw, seed, time.time(), drawn_by, len(entries), entries.total_weight(), pack_ids(winners))
+        )
+
+    async def load_draws(self, giveaway_id: str) -> list:
+        def read(conn):
+            return conn.execute(
+                "SELECT draw, seed, drawn_at, drawn_by, entrants, total_weight, winner_ids FROM giveaway_draws"
+                " WHERE giveaway_id = ? ORDER BY draw",
+                (giveaway_id,)
+            ).fetchall()
+        return [
+            {"draw": row[0], "seed": row[1], "drawn_at": row[2], "drawn_by": row[3], "entrants": row[4],
+             "total_weight": row[5], "winner_ids": list(unpack_ids(row[6]))}
+            for row in await self.db.run(read)
+        ]
+
+    async def load(self, giveaway_id: str = None):
+        """Return persisted giveaways (all, or just one) in the active_giveaways format."""
+        where, params = ("WHERE id = ?", (giveaway_id,)) if giveaway_id else ("", ())
+        def read(conn):
+            giveaways = {}
+            rows = conn.execute(
+                "SELECT id, guild_id, channel_id, message_id, host_id, title, description, winners, end_time,"
+                f" seed, bonus_role_id, bonus_entries FROM giveaways {where}",
+                params
+            )
+            for row in rows:
+                giveaways[row[0]] = {
+                    "title": row[5],
+                    "description": row[6],
+                    "winners": row[7],
+                    "end_time": datetime.fromtimestamp(row[8], timezone.utc),
+                    "participants": GiveawayEntries(),
+                    "seed": row[9],
+                    "bonus_role_id": row[10],
+                    "bonus_entries": row[11],
+                    "guild_id": row[1],
+                    "channel_id": row[2],
+                    "message_id": row[3],
+                    "host": row[4],
+                }
+            entries = conn.execute(f"SELECT giveaway_id, user_id, weight FROM giveaway_entries {where.replace('id', 'giveaway_id')}", params)
+            for entry_giveaway_id, user_id, weight in entries:
+                if entry_giveaway_id in giveaways:
+                    giveaways[entry_giveaway_id]["participants"].add(user_id, weight)
+            return giveaways
+        return await self.db.run(read)
+
+giveaway_store = GiveawayStore(state_db)
+
+class GiveawayScheduler:
+    """A single task that owns every giveaway end time.
+
+    End times live in a min-heap; the task sleeps until the earliest one (or
+    until an earlier giveaway is scheduled) and then ends it. Giveaways whose
+    end time passed while the bot was offline fire as soon as the bot is ready.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def schedule(self, giveaway_id: str, end_time: datetime):
+        heapq.heappush(self._heap, (end_time.timestamp(), giveaway_id))
+        self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        await bot.wait_until_ready()
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+            when, giveaway_id = self._heap[0]
+            delay = when - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            asyncio.create_task(self._fire(giveaway_id))
+
+    async def _fire(self, giveaway_id: str):
+        try:
+            await end_giveaway(giveaway_id)
+        except Exception as e:
+            print(f"❌ Failed to end giveaway {giveaway_id}: {e}")
+
+giveaway_scheduler = GiveawayScheduler()
+
+async def restore_giveaways():
+    # In cluster mode each worker only ends the giveaways of the guilds it owns
+    for giveaway_id, giveaway in (await giveaway_store.load()).items():
+        # Every worker listens for every giveaway's button; find_giveaway adopts ones whose guild moved here
+        bot.add_view(GiveawayView(giveaway_id))
+        if owns_guild(giveaway["guild_id"]):
+            adopt_giveaway(giveaway_id, giveaway)
+    giveaway_scheduler.start()
+    print(f"✅ Restored {len(active_giveaways)} giveaway(s)")
+
+def adopt_giveaway(giveaway_id: str, giveaway: dict):
+    active_giveaways[giveaway_id] = giveaway
+    giveaway_scheduler.schedule(giveaway_id, giveaway["end_time"])
+
+async def find_giveaway(giveaway_id: str):
+    """Look a running giveaway up in memory, falling back to the shared store.
+
+    The fallback picks up giveaways started by another cluster worker, e.g.
+    after the guild moved to this worker's shards.
+    """
+    giveaway = active_giveaways.get(giveaway_id)
+    if giveaway is None:
+        giveaway = (await giveaway_store.load(giveaway_id)).get(giveaway_id)
+        if giveaway is not None:
+            adopt_giveaway(giveaway_id, giveaway)
+    return giveaway
+
+async def discard_giveaway(giveaway_id: str):
+    active_giveaways.pop(giveaway_id, None)
+    await giveaway_store.delete(giveaway_id)
+
+class GiveawayView(View):
+    def __init__(self, giveaway_id):
+        super().__init__(timeout=None)
+        self.giveaway_id = giveaway_id
+        self.add_item(RoutedButton(label="🎉 Enter Giveaway", style=discord.ButtonStyle.primary, custom_id=f"enter_giveaway_{giveaway_id}"))
+
+@bot.tree.command(name="embed", description="Create a custom embed message")
+async def embed_command(
+    interaction: discord.Interaction,
+    title: str,
+    description: str,
+    image_url: str = None,
+    color: str = "blurple"
+):
+    # Color mapping
+    color_map = {
+        "red": discord.Color.red(),
+        "green": discord.Color.green(),
+        "blue": discord.Color.blue(),
+        "yellow": discord.Color.yellow(),
+        "orange": discord.Color.orange(),
+        "purple": discord.Color.purple(),
+        "blurple": discord.Color.blurple(),
+        "gold": discord.Color.gold(),
+        "dark_red": discord.Color.dark_red(),
+        "dark_green": discord.Color.dark_green(),
+        "dark_blue": discord.Color.dark_blue(),
+        "dark_purple": discord.Color.dark_purple(),
+        "dark_gold": discord.Color.dark_gold(),
+        "teal": discord.Color.teal(),
+        "dark_teal": discord.Color.dark_teal(),
+        "magenta": discord.Color.magenta(),
+        "dark_magenta": discord.Color.dark_magenta()
+    }
+    
+    # Get the color, default to blurple if invalid
+    embed_color = color_map.get(color.lower(), discord.Color.blurple())
+    
+    # Create the embed
+    embed = discord.Embed(
+        title=title,
+        description=description,
+        color=embed_color,
+        timestamp=datetime.now(timezone.utc)
+    )
+    
+    # Add image if provided
+    if image_url:
+        try:
+            embed.set_image(url=image_url)
+        except:
+            await interaction.response.send_message("❌ Invalid image URL provided!", ephemeral=True)
+            return
+    
+    # Add footer with author info
+    embed.set_footer(text=f"Created by {interaction.user.display_name}", icon_url=interaction.user.avatar.url if interaction.user.avatar else None)
+    
+    try:
+        await interaction.response.send_message(embed=embed)
+    except Exception as e:
+        await interaction.response.send_message(f"❌ Failed to create embed: {str(e)}", ephemeral=True)
+
+@bot.tree.command(name="giveaway", description="Create a giveaway")
+async def giveaway(
+    interaction: discord.Interaction,
+    title: str,
+    description: str,
+    duration_minutes: int,
+    winners: int = 1,
+    bonus_role: discord.Role = None,
+    bonus_entries: int = 1
+):
+    if winners < 1:
+        await interaction.response.send_message("❌ Number of winners must be at least 1!", ephemeral=True)
+        return
+    
+    if duration_minutes < 1:
+        await interaction.response.send_message("❌ Duration must be at least 1 minute!", ephemeral=True)
+        return
+
+    if bonus_role is not None and not 1 <= bonus_entries <= GIVEAWAY_MAX_BONUS_ENTRIES:
+        await interaction.response.send_message(f"❌ Bonus entries must be between 1 and {GIVEAWAY_MAX_BONUS_ENTRIES}!", ephemeral=True)
+        return
+
+    giveaway_id = f"{interaction.guild.id}_{int(datetime.now(timezone.utc).timestamp())}"
+    end_time = datetime.now(timezone.utc) + timedelta(minutes=duration_minutes)
+    
+    embed = discord.Embed(
+        title=f"🎉 {title}",
+        description=f"{description}\n\n"
+                   f"**Winners:** {winners}\n"
+                   f"**Duration:** {duration_minutes} minutes\n"
+                   f"**Ends:** <t:{int(end_time.timestamp())}:R>\n"
+                   + (f"**Bonus:** {bonus_role.mention} gets +{bonus_entries} entries\n" if bonus_role else "")
+                   + "\n**Participants:** 0",
+        color=discord.Color.gold()
+    )
+    embed.set_footer(text=f"Giveaway ID: {giveaway_id}")
+    
+    view = GiveawayView(giveaway_id)
+    
+    # Store giveaway data
+    active_giveaways[giveaway_id] = {
+        "title": title,
+        "description": description,
+        "winners": winners,
+        "end_time": end_time,
+        "participants": GiveawayEntries(),
+        "seed": new_giveaway_seed(),
+        "bonus_role_id": bonus_role.id if bonus_role else None,
+        "bonus_entries": bonus_entries if bonus_role else 0,
+        "guild_id": interaction.guild.id,
+        "channel_id": interaction.channel.id,
+        "message_id": None,
+        "host": interaction.user.id
+    }
+    
+    await interaction.response.send_message(embed=embed, view=view)
+    
+    # Get the message ID for later editing
+    message = await interaction.original_response()
+    active_giveaways[giveaway_id]["message_id"] = message.id
+    await giveaway_store.save(giveaway_id, active_giveaways[giveaway_id])
+    
+    # Schedule the giveaway end
+    giveaway_scheduler.schedule(giveaway_id, end_time)
+
+# ------------------------
+# Giveaway Embed Refresh (debounced)
+# ------------------------
+GIVEAWAY_REFRESH_SECONDS = float(os.getenv("GIVEAWAY_REFRESH_SECONDS", "5"))
+
+giveaway_refreshes = {}  # giveaway_id -> pending refresh task
+giveaway_last_refresh = {}  # giveaway_id -> loop time of the last embed edit
+
+def build_giveaway_embed(giveaway_id: str, giveaway: dict):
+    embed = discord.Embed(
+        title=f"🎉 {giveaway['title']}",
+        description=f"{giveaway['description']}\n\n"
+                   f"**Winners:** {giveaway['winners']}\n"
+                   f"**Ends:** <t:{int(giveaway['end_time'].timestamp())}:R>\n"
+                   + (f"**Bonus:** <@&{giveaway['bonus_role_id']}> gets +{giveaway['bonus_entries']} entries\n" if giveaway["bonus_role_id"] else "")
+                   + f"\n**Participants:** {len(giveaway['participants'])}",
+        color=discord.Color.gold()
+    )
+    embed.set_footer(text=f"Giveaway ID: {giveaway_id}")
+    return embed
+
+def schedule_giveaway_refresh(giveaway_id: str):
+    # At most one pending refresh per giveaway; later entries ride along with it
+    if giveaway_id not in giveaway_refreshes:
+        giveaway_refreshes[giveaway_id] = asyncio.create_task(refresh_giveaway_embed(giveaway_id))
+
+def cancel_giveaway_refresh(giveaway_id: str):
+    task = giveaway_refreshes.pop(giveaway_id, None)
+    if task:
+        task.cancel()
+    giveaway_last_refresh.pop(giveaway_id, None)
+
+async def refresh_giveaway_embed(giveaway_id: str):
+    loop = asyncio.get_running_loop()
+    wait = giveaway_last_refresh.get(giveaway_id, 0) + GIVEAWAY_REFRESH_SECONDS - loop.time()
+    if wait > 0:
+        await asyncio.sleep(wait)
+
+    # Entries arriving while we edit schedule the next refresh
+    giveaway_refreshes.pop(giveaway_id, None)
+    giveaway = active_giveaways.get(giveaway_id)
+    if giveaway is None or giveaway["message_id"] is None:
+        return
+    channel = bot.get_channel(giveaway["channel_id"])
+    if channel is None:
+        return
+
+    giveaway_last_refresh[giveaway_id] = loop.time()
+    try:
+        message = channel.get_partial_message(giveaway["message_id"])
+        await outbound.submit(
+            PRIORITY_ANNOUNCEMENT, ("channel", channel.id),
+            lambda: message.edit(embed=build_giveaway_embed(giveaway_id, giveaway)),
+            coalesce=("giveaway_embed", giveaway_id)
+        )
+    except discord.HTTPException as e:
+        print(f"❌ Failed to refresh giveaway {giveaway_id}: {e}")
+
+GIVEAWAY_END_RETRY_SECONDS = 30  # first retry after a failed end; doubles up to GIVEAWAY_END_RETRY_MAX_SECONDS
+GIVEAWAY_END_RETRY_MAX_SECONDS = 3600
+# Failures worth waiting out; anything else (missing permissions, a rejected edit) won't fix itself
+GIVEAWAY_END_RETRY_ERRORS = (discord.DiscordServerError, aiohttp.ClientError, asyncio.TimeoutError, OSError)
+
+giveaway_end_retries = {}  # giveaway_id -> delay before its next retry
+
+def retry_end_giveaway(giveaway_id: str, reason: str):
+    """Try ending a giveaway again later; it stays persisted until it ends for good."""
+    delay = giveaway_end_retries.get(giveaway_id, GIVEAWAY_END_RETRY_SECONDS)
+    giveaway_end_retries[giveaway_id] = min(delay * 2, GIVEAWAY_END_RETRY_MAX_SECONDS)
+    print(f"⚠️ Couldn't end giveaway {giveaway_id} ({reason}); retrying in {delay}s")
+    giveaway_scheduler.schedule(giveaway_id, datetime.now(timezone.utc) + timedelta(seconds=delay))
+
+async def end_giveaway(giveaway_id: str):
+    if giveaway_id not in active_giveaways:
+        return
+    
+    giveaway = active_giveaways[giveaway_id]
+    cancel_giveaway_refresh(giveaway_id)
+    guild = bot.get_guild(giveaway["guild_id"])
+    if (guild is None and not bot.is_ready()) or (guild is not None and guild.unavailable):
+        # e.g. right after a restart, before the guild has streamed in
+        retry_end_giveaway(giveaway_id, "its server is unavailable")
+        return
+    channel = guild.get_channel(giveaway["channel_id"]) if guild is not None else None
+    
+    if guild is not None and (not channel or giveaway["message_id"] is None):
+        # The guild is available, so a missing channel was deleted
+        giveaway_end_retries.pop(giveaway_id, None)
+        await discard_giveaway(giveaway_id)
+        return
+    
+    participants = giveaway["participants"]
+    
+    winners = []
+    if len(participants) == 0:
+        # No participants
+        embed = discord.Embed(
+            title=f"🎉 {giveaway['title']} - ENDED",
+            description=f"{giveaway['description']}\n\n"
+                       f"**Winners:** {giveaway['winners']}\n"
+                       f"**Result:** No participants! 😢",
+            color=discord.Color.red()
+        )
+        embed.set_footer(text=f"Giveaway ID: {giveaway_id}")
+        announcement = "🎉 **Giveaway Ended!** No one participated in this giveaway. 😢"
+        
+    else:
+        # Pick winners
+        num_winners = min(giveaway["winners"], len(participants))
+        winners = await asyncio.to_thread(draw_winners, participants, num_winners, giveaway["seed"], 0)
+        
+        # Large draws don't fit in one message; the mentions end in "and N more" instead
+        head = f"{giveaway['description']}\n\n**Winners:** {num_winners}\n**🏆 Winner(s):** "
+        tail = f"\n**Total Participants:** {len(participants)}"
+        embed = discord.Embed(
+            title=f"🎉 {giveaway['title']} - ENDED",
+            description=head + format_mentions(winners, EMBED_DESCRIPTION_LIMIT - len(head) - len(tail)) + tail,
+            color=discord.Color.green()
+        )
+        embed.set_footer(text=f"Giveaway ID: {giveaway_id}")
+        
+        head = f"🎉 **Giveaway Results!** 🎉\n\n**{giveaway['title']}** has ended!\n\n🏆 **Winner(s):** "
+        tail = "\n\nCongratulations! 🥳"
+        announcement = head + format_mentions(winners, MESSAGE_CONTENT_LIMIT - len(head) - len(tail)) + tail
+    
+    if guild is None:
+        # The bot was removed from the server: nothing can be posted there, but keep the draw
+        print(f"⚠️ Giveaway {giveaway_id}'s server is gone; archiving it without announcing")
+        giveaway_end_retries.pop(giveaway_id, None)
+        active_giveaways.pop(giveaway_id, None)
+        await giveaway_store.archive(giveaway_id, giveaway, winners)
+        return
+    
+    # The draw is seeded, so a retry after a failed edit picks the same winners
+    message = channel.get_partial_message(giveaway["message_id"])
+    try:
+        await outbound.submit(PRIORITY_ANNOUNCEMENT, ("channel", channel.id), lambda: message.edit(embed=embed, view=None))
+    except discord.NotFound:
+        giveaway_end_retries.pop(giveaway_id, None)
+        await discard_giveaway(giveaway_id)
+        return
+    except GIVEAWAY_END_RETRY_ERRORS as e:
+        retry_end_giveaway(giveaway_id, str(e) or type(e).__name__)
+        return
+    except Exception as e:
+        # Retrying won't help; end it anyway so /reroll and the announcement still work
+        print(f"❌ Couldn't update giveaway {giveaway_id}'s message, ending it anyway: {e}")
+    giveaway_end_retries.pop(giveaway_id, None)
+    
+    # Archive so /reroll can find the participants later
+    active_giveaways.pop(giveaway_id, None)
+    await giveaway_store.archive(giveaway_id, giveaway, winners)
+    
+    try:
+        await outbound.send(PRIORITY_ANNOUNCEMENT, channel, announcement)
+    except discord.HTTPException as e:
+        print(f"❌ Failed to announce the end of giveaway {giveaway_id}: {e}")
+
+@bot.tree.command(name="reroll", description="Reroll winners for a giveaway")
+async def reroll_giveaway(
+    interaction: discord.Interaction,
+    giveaway_id: str
+):
+    if giveaway_id in active_giveaways:
+        await interaction.response.send_message("❌ This giveaway hasn't ended yet! You can only reroll ended giveaways.", ephemeral=True)
+        return
+
+    await interaction_jobs.dispatch(interaction, "reroll", lambda job: reroll_job(job, giveaway_id))
+
+async def reroll_job(job: Job, giveaway_id: str):
+    interaction = job.interaction
+    with job.step("load_archive"):
+        giveaway = await giveaway_store.load_archived(giveaway_id)
+    if giveaway is None or giveaway["guild_id"] != interaction.guild.id:
+        await job.reply("❌ Giveaway not found! Make sure you're using the right giveaway ID.")
+        return
+
+    participants = giveaway["participants"]
+    if not participants:
+        await job.reply("❌ No participants found for this giveaway!")
+        return
+    
+    # Pick new winners; every reroll is a new numbered draw from the same seed
+    num_winners = min(giveaway["winners"], len(participants))
+    with job.step("draw"):
+        _, new_winners = await giveaway_store.reroll(giveaway_id, giveaway["seed"], interaction.user.id, participants, num_winners)
+    
+    # Update the original giveaway message, wherever it was posted
+    head = f"{giveaway['description']}\n\n**Winners:** {num_winners}\n**🏆 New Winner(s):** "
+    tail = f"\n**Total Participants:** {len(participants)}\n\n🔄 **Rerolled by:** {interaction.user.mention}"
+    new_embed = discord.Embed(
+        title=f"🎉 {giveaway['title']} - REROLLED",
+        description=head + format_mentions(new_winners, EMBED_DESCRIPTION_LIMIT - len(head) - len(tail)) + tail,
+        color=discord.Color.purple()
+    )
+    new_embed.set_footer(text=f"Giveaway ID: {giveaway_id}")
+    
+    channel = bot.get_channel(giveaway["channel_id"])
+    if channel and giveaway["message_id"]:
+        try:
+            with job.step("edit_message"):
+                message = channel.get_partial_message(giveaway["message_id"])
+                await outbound.submit(PRIORITY_ANNOUNCEMENT, ("channel", channel.id), lambda: message.edit(embed=new_embed))
+        except discord.HTTPException:
+            pass  # the original message was deleted; the announcement still goes out
+    
+    # Send reroll announcement; the deferred reply is ephemeral, so the announcement is a second followup
+    head = f"🔄 **Giveaway Rerolled!** 🔄\n\n**{giveaway['title']}** has been rerolled by {interaction.user.mention}!\n\n🏆 **New Winner(s):** "
+    tail = "\n\nCongratulations to the new winners! 🥳"
+    reroll_msg = head + format_mentions(new_winners, MESSAGE_CONTENT_LIMIT - len(head) - len(tail)) + tail
+    
+    await job.reply("✅ Giveaway rerolled!")
+    with job.step("announce"):
+        await job.reply(reroll_msg, ephemeral=False)
+
+@bot.tree.command(name="giveaway_audit", description="Show a giveaway's draws and verify they reproduce")
+@discord.app_commands.guild_only()
+async def giveaway_audit(interaction: discord.Interaction, giveaway_id: str):
+    await interaction_jobs.dispatch(interaction, "giveaway_audit", lambda job: giveaway_audit_job(job, giveaway_id))
+
+async def giveaway_audit_job(job: Job, giveaway_id: str):
+    with job.step("load_archive"):
+        giveaway = await giveaway_store.load_archived(giveaway_id)
+        draws = await giveaway_store.load_draws(giveaway_id) if giveaway else []
+    if giveaway is None or giveaway["guild_id"] != job.interaction.guild.id:
+        await job.reply("❌ Giveaway not found! Make sure you're using the right giveaway ID.")
+        return
+    if not draws:
+        await job.reply("❌ This giveaway has no recorded draws.")
+        return
+
+    entries = giveaway["participants"]
+    embed = discord.Embed(
+        title=f"🔍 Draw audit: {giveaway['title']}",
+        description=f"**Entrants:** {len(entries)}\n**Entries:** {entries.total_weight()}",
+        color=discord.Color.gold()
+    )
+    embed.set_footer(text=f"Giveaway ID: {giveaway_id}")
+    fields = []
+    for record in draws[-10:]:
+        # Re-run the draw from its seed over the archived entries
+        with job.step("replay"):
+            replayed = await asyncio.to_thread(draw_winners, entries, len(record["winner_ids"]), record["seed"], record["draw"])
+        verdict = "✅ reproduced" if replayed == record["winner_ids"] else "❌ does not reproduce"
+        drawn_by = f"<@{record['drawn_by']}>" if record["drawn_by"] else "schedule"
+        label = "Original draw" if record["draw"] == 0 else f"Reroll #{record['draw']}"
+        fields.append((f"{label} · {verdict}", f"Seed `{record['seed']}` · by {drawn_by} <t:{int(record['drawn_at'])}:R>\n🏆 ", record["winner_ids"]))
+
+    # Share what's left of the embed's size limit between the winner lists
+    room = EMBED_TOTAL_LIMIT - len(embed) - sum(len(name) + len(value) for name, value, _ in fields)
+    for name, value, winner_ids in fields:
+        limit = min(EMBED_FIELD_LIMIT - len(value), room // len(fields))
+        embed.add_field(name=name, value=value + format_mentions(winner_ids, limit), inline=False)
+    await job.reply(embed=embed)
+
+
+# ------------------------
+# Close Ticket Button
+# ------------------------
+class CloseView(View):
+    def __init__(self):
+        super().__init__(timeout=None)
+        self.add_item(RoutedButton(label="🔒 Close Ticket", style=discord.ButtonStyle.secondary, custom_id="close_ticket"))
+
+
+# ------------------------
+# Transcript Writer
+# ------------------------
+TRANSCRIPT_PAGE_SIZE = 500  # messages per rendering batch sent to the pool
+TRANSCRIPT_RENDER_AHEAD = 4  # pages rendering at once; bounds memory on long tickets
+TRANSCRIPT_RENDER_WORKERS = int(os.getenv("TRANSCRIPT_RENDER_WORKERS", "2"))
+TRANSCRIPT_SPOOL_BYTES = 4 * 1024 * 1024  # spill to a temp file above this size
+TRANSCRIPT_GZIP = os.getenv("TRANSCRIPT_GZIP", "0") == "1"
+
+def message_record(msg: discord.Message) -> dict:
+    """The parts of a message a transcript needs, as plain picklable data."""
+    return {
+        "id": msg.id,
+        "created_at": msg.created_at.timestamp(),
+        "author": str(msg.author),
+        "author_id": msg.author.id,
+        "display_name": msg.author.display_name,
+        "avatar_url": msg.author.display_avatar.url,
+        "bot": msg.author.bot,
+        "content": msg.content,
+        "attachments": [(a.filename, a.url, a.size) for a in msg.attachments],
+        "embeds": [embed.to_dict() for embed in msg.embeds],
+        "reply_to": msg.reference.message_id if msg.reference else None,
+    }
+
+class TranscriptRenderer:
+    """Formats transcript pages in worker processes, off the event loop.
+
+    A 50k-message ticket is a lot of string formatting and HTML escaping;
+    done in a process pool it can't stall the gateway heartbeat or other
+    handlers. Workers import the stdlib-only transcript_render module; they
+    also re-run the main script as ``__mp_main__``, which is why main.py is
+    only a launcher and the bot lives in this module.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._pool = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Don't fork the bot itself: it has threads and a large heap. The
+            # fork server loads the renderer once and workers fork from it.
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload(["transcript_render"])
+            else:
+                context = multiprocessing.get_context("spawn")
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=context)
+        return self._pool
+
+    async def start(self):
+        """Start the workers now rather than on the first close, which would stall briefly."""
+        await self.render([])
+
+    async def render(self, records: list) -> tuple:
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor(), transcript_render.render_page, records)
+        except BrokenProcessPool:
+            self._pool = None  # a worker died; start a fresh pool for the next page
+            raise
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+transcript_renderer = TranscriptRenderer(TRANSCRIPT_RENDER_WORKERS)
+
+class TranscriptWriter:
+    """Streams channel history into spooled plain-text and HTML transcripts.
+
+    Messages are collected a page at a time as plain records and rendered by
+    the process pool. At most TRANSCRIPT_RENDER_AHEAD pages are in flight,
+    so memory stays flat however long the ticket is. Both files are
+    optionally gzipped.
+    """
+
+    def __init__(self, name: str, compress: bool = TRANSCRIPT_GZIP):
+        suffix = ".gz" if compress else ""
+        self.filename = f"transcript-{name}.txt" + suffix
+        self.html_filename = f"transcript-{name}.html" + suffix
+        self.message_count = 0
+        self._spool = tempfile.SpooledTemporaryFile(max_size=TRANSCRIPT_SPOOL_BYTES)
+        self._html_spool = tempfile.SpooledTemporaryFile(max_size=TRANSCRIPT_SPOOL_BYTES)
+        if compress:
+            self._sink = gzip.GzipFile(fileobj=self._spool, mode="wb")
+            self._html_sink = gzip.GzipFile(fileobj=self._html_spool, mode="wb")
+        else:
+            self._sink, self._html_sink = self._spool, self._html_spool
+        self._html_sink.write(transcript_render.html_head(name).encode())
+        self._page = []
+        self._rendering = deque()  # render futures, oldest page first
+
+    async def add(self, msg: discord.Message):
+        self._page.append(message_record(msg))
+        self.message_count += 1
+        if len(self._page) >= TRANSCRIPT_PAGE_SIZE:
+            await self._submit_page()
+
+    async def _submit_page(self):
+        if self._page:
+            self._rendering.append(asyncio.ensure_future(transcript_renderer.render(self._page)))
+            self._page = []
+        while len(self._rendering) > TRANSCRIPT_RENDER_AHEAD:
+            await self._write_oldest()
+
+    async def _write_oldest(self):
+        text, html = await self._rendering.popleft()
+        self._sink.write(text)
+        self._html_sink.write(html)
+
+    async def write_history(self, channel: discord.TextChannel):
+        try:
+            async for msg in channel.history(limit=None, oldest_first=True):
+                await self.add(msg)
+            await self.finish()
+        except BaseException:
+            for future in self._rendering:
+                future.cancel()
+            raise
+
+    async def finish(self):
+        """Render what's left and finalize both files."""
+        await self._submit_page()
+        while self._rendering:
+            await self._write_oldest()
+        if self.message_count == 0:
+            self._sink.write("No messages were sent in this ticket.".encode())
+            self._html_sink.write(transcript_render.HTML_EMPTY.encode())
+        self._html_sink.write(transcript_render.HTML_FOOT.encode())
+        if self._sink is not self._spool:
+            self._sink.close()  # writes the gzip trailers, the spools stay open
+            self._html_sink.close()
+
+    @property
+    def text_size(self) -> int:
+        """Size of the finished text file in bytes, as uploaded."""
+        return self._spool.seek(0, os.SEEK_END)
+
+    @property
+    def html_size(self) -> int:
+        return self._html_spool.seek(0, os.SEEK_END)
+
+    def to_file(self) -> discord.File:
+        self._spool.seek(0)
+        return discord.File(self._spool, filename=self.filename)
+
+    def to_html_file(self) -> discord.File:
+        self._html_spool.seek(0)
+        return discord.File(self._html_spool, filename=self.html_filename)
+
+    def text_pages(self, page_bytes: int):
+        """Yield the finished text transcript in UTF-8 chunks of about page_bytes,
+        split at line ends; call after finish()."""
+        self._spool.seek(0)
+        source = gzip.GzipFile(fileobj=self._spool, mode="rb") if self.filename.endswith(".gz") else self._spool
+        rest = b""
+        while chunk := source.read(page_bytes):
+            data = rest + chunk
+            cut = data.rfind(b"\n") + 1
+            if cut:
+                yield data[:cut]
+            rest = data[cut:]
+        if rest:
+            yield rest
+
+    def close(self):
+        self._spool.close()
+        self._html_spool.close()
+
+
+# ------------------------
+# Transcript Archive
+# ------------------------
+TRANSCRIPT_DB = os.getenv("TRANSCRIPT_DB", "transcripts.db")
+TRANSCRIPT_ARCHIVE_DIR = os.getenv("TRANSCRIPT_ARCHIVE_DIR", "transcripts")
+TRANSCRIPT_SEGMENT_BYTES = 64 * 1024 * 1024  # start a new segment file past this size
+TRANSCRIPT_SEARCH_LIMIT = 10
+TRANSCRIPT_QUERY_SHOWN = 200  # characters of the query echoed back in search results
+TRANSCRIPT_INDEX_PAGE_BYTES = 256 * 1024  # text compressed and indexed as one unit
+
+transcript_db = StateStore(TRANSCRIPT_DB)
+transcript_db.add_schema("""
+CREATE TABLE IF NOT EXISTS transcripts (
+    id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    ticket_type TEXT,
+    channel_name TEXT NOT NULL,
+    opener_id INTEGER,
+    closer_id INTEGER NOT NULL,
+    opened_at REAL NOT NULL,
+    closed_at REAL NOT NULL,
+    message_count INTEGER NOT NULL,
+    segment TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transcripts_by_guild ON transcripts (guild_id, closed_at);
+-- Each page is its own gzip member inside the transcript's span of the segment
+CREATE TABLE IF NOT EXISTS transcript_pages (
+    id INTEGER PRIMARY KEY,
+    transcript_id INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+-- Contentless index over pages: the text itself lives compressed in the segment files
+CREATE VIRTUAL TABLE IF NOT EXISTS transcript_page_fts USING fts5(guild, body, content='');
+""")
+
+class TranscriptArchive:
+    """Closed ticket transcripts, kept locally for /transcript_search.
+
+    Each transcript is streamed from its spool into a segment file as a run of
+    gzip members, one per TRANSCRIPT_INDEX_PAGE_BYTES page, so neither
+    archiving nor a search hit needs the whole transcript in memory. Pages are
+    indexed in a contentless SQLite FTS5 table whose rowid points at the page
+    row. Everything runs on the archive database's worker thread, which also
+    serializes segment appends. Cluster workers write separate segment files.
+    """
+
+    def __init__(self, db: StateStore, directory: str):
+        self.db = db
+        self.directory = directory
+        self._segment = None
+
+    def _segment_path(self) -> str:
+        if self._segment is None:
+            os.makedirs(self.directory, exist_ok=True)
+            prefix = f"segment-w{WORKER_ID}-"
+            existing = sorted(name for name in os.listdir(self.directory) if name.startswith(prefix))
+            self._segment = existing[-1] if existing else f"{prefix}00001.gz"
+        path = os.path.join(self.directory, self._segment)
+        if os.path.exists(path) and os.path.getsize(path) >= TRANSCRIPT_SEGMENT_BYTES:
+            number = int(self._segment.rsplit("-", 1)[1].split(".")[0]) + 1
+            self._segment = f"segment-w{WORKER_ID}-{number:05d}.gz"
+            path = os.path.join(self.directory, self._segment)
+        return path
+
+    async def add(self, meta: dict, transcript: TranscriptWriter) -> int:
+        def write(conn):
+            path = self._segment_path()
+            with conn, open(path, "ab") as f:
+                start = f.tell()
+                transcript_id = conn.execute(
+                    "INSERT INTO transcripts (guild_id, ticket_type, channel_name, opener_id, closer_id, opened_at,"
+                    " closed_at, message_count, segment, offset, length) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                    (meta["guild_id"], meta["ticket_type"], meta["channel_name"], meta["opener_id"], meta["closer_id"],
+                     meta["opened_at"], meta["closed_at"], transcript.message_count, self._segment, start)
+                ).lastrowid
+                for page in transcript.text_pages(TRANSCRIPT_INDEX_PAGE_BYTES):
+                    data = gzip.compress(page)
+                    page_id = conn.execute(
+                        "INSERT INTO transcript_pages (transcript_id, offset, length) VALUES (?, ?, ?)",
+                        (transcript_id, f.tell(), len(data))
+                    ).lastrowid
+                    f.write(data)
+                    conn.execute("INSERT INTO transcript_page_fts (rowid, guild, body) VALUES (?, ?, ?)",
+                                 (page_id, f"g{meta['guild_id']}", page.decode()))
+                conn.execute("UPDATE transcripts SET length = ? WHERE id = ?", (f.tell() - start, transcript_id))
+            return transcript_id
+        return await self.db.run(write)
+
+    def read(self, segment: str, offset: int, length: int) -> str:
+        """Read a whole transcript, or one page of it, back from its segment."""
+        with open(os.path.join(self.directory, segment), "rb") as f:
+            f.seek(offset)
+            return gzip.decompress(f.read(length)).decode()
+
+    async def search(self, guild_id: int, query: str, opener_id: int = None, ticket_type: str = None):
+        terms = re.findall(r"\w+", query)
+        if not terms:
+            return []
+        # Quote every term so user input can't be parsed as FTS5 query syntax
+        match = f'guild : "g{guild_id}" AND body : ({" ".join(chr(34) + t + chr(34) for t in terms)})'
+        filters, params = "", [match]
+        if opener_id is not None:
+            filters += " AND t.opener_id = ?"
+            params.append(opener_id)
+        if ticket_type is not None:
+            filters += " AND t.ticket_type = ?"
+            params.append(ticket_type)
+
+        def read(conn):
+            rows = conn.execute(
+                "SELECT t.id, t.ticket_type, t.channel_name, t.opener_id, t.closer_id, t.opened_at, t.closed_at,"
+                " t.message_count, t.segment, p.offset, p.length FROM transcript_page_fts f"
+                " JOIN transcript_pages p ON p.id = f.rowid JOIN transcripts t ON t.id = p.transcript_id"
+                f" WHERE transcript_page_fts MATCH ?{filters} ORDER BY f.rank",
+                params
+            )
+            results, seen = [], set()
+            lowered = [t.lower() for t in terms]
+            # Rows are pages, best first; the snippet comes from each transcript's best page only
+            for row in rows:
+                if row[0] in seen:
+                    continue
+                seen.add(row[0])
+                snippet = next(
+                    (line for line in self.read(*row[8:11]).splitlines() if any(t in line.lower() for t in lowered)),
+                    ""
+                )
+                results.append({
+                    "id": row[0], "ticket_type": row[1], "channel_name": row[2], "opener_id": row[3],
+                    "closer_id": row[4], "opened_at": row[5], "closed_at": row[6], "message_count": row[7],
+                    "snippet": snippet[:200],
+                })
+                if len(results) >= TRANSCRIPT_SEARCH_LIMIT:
+                    break
+            return results
+        return await self.db.run(read)
+
+transcript_archive = TranscriptArchive(transcript_db, TRANSCRIPT_ARCHIVE_DIR)
+
+
+# ------------------------
+# Guild Resource Cache
+# ------------------------
+class GuildResources:
+    """Per-guild IDs of the ticket log channel and support role.
+
+    Each resource is found by name once, then looked up by ID. Entries are
+    invalidated from channel and role events, and creation is serialized per
+    guild so concurrent first clicks create a resource only once.
+    """
+
+    # kind -> (name, is_channel, type check)
+    KINDS = {
+        "log_channel": (LOG_CHANNEL_NAME, True, lambda c: isinstance(c, discord.TextChannel)),
+        "support_role": (SUPPORT_ROLE_NAME, False, lambda r: True),
+    }
+
+    def __init__(self):
+        self._ids = {}  # guild_id -> {kind: object id, or None if it does not exist}
+        self._locks = {}  # guild_id -> asyncio.Lock
+
+    def lock(self, guild_id: int) -> asyncio.Lock:
+        if guild_id not in self._locks:
+            self._locks[guild_id] = asyncio.Lock()
+        return self._locks[guild_id]
+
+    def get(self, guild: discord.Guild, kind: str):
+        name, is_channel, matches = self.KINDS[kind]
+        cached = self._ids.setdefault(guild.id, {})
+        if kind not in cached:
+            candidates = guild.channels if is_channel else guild.roles
+            found = discord.utils.find(lambda o: o.name == name and matches(o), candidates)
+            cached[kind] = found.id if found else None
+        if cached[kind] is None:
+            return None
+        return guild.get_channel(cached[kind]) if is_channel else guild.get_role(cached[kind])
+
+    def set(self, guild_id: int, kind: str, object_id: int):
+        self._ids.setdefault(guild_id, {})[kind] = object_id
+
+    def invalidate(self, obj, is_channel: bool, deleted: bool = False):
+        cached = self._ids.get(obj.guild.id)
+        if not cached:
+            return
+        for kind, (name, kind_is_channel, matches) in self.KINDS.items():
+            if kind_is_channel != is_channel or kind not in cached:
+                continue
+            if cached[kind] == obj.id:
+                if deleted or obj.name != name or not matches(obj):
+                    del cached[kind]
+            elif cached[kind] is None and not deleted and obj.name == name and matches(obj):
+                del cached[kind]
+
+    def forget(self, guild_id: int):
+        self._ids.pop(guild_id, None)
+        self._locks.pop(guild_id, None)
+
+guild_resources = GuildResources()
+
+async def get_log_channel(guild: discord.Guild) -> discord.TextChannel:
+    log_channel = guild_resources.get(guild, "log_channel")
+    if log_channel is not None:
+        return log_channel
+    async with guild_resources.lock(guild.id):
+        log_channel = guild_resources.get(guild, "log_channel")
+        if log_channel is None:
+            log_channel = await outbound.submit(
+                PRIORITY_TICKET, ("guild", guild.id), lambda: guild.create_text_channel(LOG_CHANNEL_NAME)
+            )
+            guild_resources.set(guild.id, "log_channel", log_channel.id)
+    return log_channel
+
+@bot.event
+async def on_guild_channel_create(channel: discord.abc.GuildChannel):
+    guild_resources.invalidate(channel, is_channel=True)
+    ticket_categories.channel_created(channel)
+
+@bot.event
+async def on_guild_channel_update(before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+    guild_resources.invalidate(after, is_channel=True)
+    ticket_categories.channel_updated(before, after)
+
+@bot.event
+async def on_guild_channel_delete(channel: discord.abc.GuildChannel):
+    guild_resources.invalidate(channel, is_channel=True, deleted=True)
+    ticket_categories.channel_deleted(channel)
+    ticket_pool.discard(channel.id, channel.guild.id)
+    ticket_registry.remove(channel.id)
+
+@bot.event
+async def on_guild_role_create(role: discord.Role):
+    guild_resources.invalidate(role, is_channel=False)
+
+@bot.event
+async def on_guild_role_update(before: discord.Role, after: discord.Role):
+    guild_resources.invalidate(after, is_channel=False)
+
+@bot.event
+async def on_guild_role_delete(role: discord.Role):
+    guild_resources.invalidate(role, is_channel=False, deleted=True)
+
+@bot.event
+async def on_guild_remove(guild: discord.Guild):
+    guild_resources.forget(guild.id)
+    ticket_categories.forget(guild.id)
+    ticket_registry.forget_guild(guild.id)
+
+
+# ------------------------
+# Ticket Categories (overflow shards)
+# ------------------------
+CATEGORY_CHANNEL_LIMIT = 50  # Discord's cap on channels in one category
+
+class TicketCategories:
+    """The TICKETS category plus its overflow shards (TICKETS-2, TICKETS-3, ...).
+
+    Each guild's shards are discovered once; after that the channels in each
+    shard are tracked from channel events, so picking the least-full category
+    never scans the guild. Emptied overflow shards are deleted again.
+    """
+
+    def __init__(self):
+        self._shards = {}  # guild_id -> {category_id: set of channel IDs in it}
+        self._pending = {}  # category_id -> channels currently being created in it
+
+    @staticmethod
+    def is_ticket_category(channel) -> bool:
+        if not isinstance(channel, discord.CategoryChannel):
+            return False
+        name = channel.name
+        prefix = f"{TICKET_CATEGORY_NAME}-"
+        return name == TICKET_CATEGORY_NAME or (name.startswith(prefix) and name[len(prefix):].isdigit())
+
+    def _discover(self, guild: discord.Guild) -> dict:
+        shards = self._shards.get(guild.id)
+        if shards is None:
+            shards = {c.id: {ch.id for ch in c.channels} for c in guild.categories if self.is_ticket_category(c)}
+            self._shards[guild.id] = shards
+        return shards
+
+    def categories(self, guild: discord.Guild) -> list:
+        shards = self._discover(guild)
+        return [c for c in map(guild.get_channel, shards) if c is not None]
+
+    def open_count(self, guild_id: int) -> int:
+        return sum(len(channels) for channels in self._shards.get(guild_id, {}).values())
+
+    def _load(self, shards: dict, category_id: int) -> int:
+        return len(shards[category_id]) + self._pending.get(category_id, 0)
+
+    def _least_full(self, guild: discord.Guild):
+        shards = self._discover(guild)
+        for category_id in sorted(shards, key=lambda cid: self._load(shards, cid)):
+            if self._load(shards, category_id) >= CATEGORY_CHANNEL_LIMIT:
+                break
+            category = guild.get_channel(category_id)
+            if category is not None:
+                return category
+        return None
+
+    @contextlib.asynccontextmanager
+    async def slot(self, guild: discord.Guild):
+        """Reserve room for one new channel in the least-full ticket category."""
+        category = self._least_full(guild)
+        if category is None:
+            async with guild_resources.lock(guild.id):
+                category = self._least_full(guild) or await self._create(guild)
+        self._pending[category.id] = self._pending.get(category.id, 0) + 1
+        try:
+            yield category
+        finally:
+            self._pending[category.id] -= 1
+            if not self._pending[category.id]:
+                del self._pending[category.id]
+
+    async def _create(self, guild: discord.Guild) -> discord.CategoryChannel:
+        shards = self._discover(guild)
+        names = {c.name for c in self.categories(guild)}
+        primary = discord.utils.find(lambda c: c.name == TICKET_CATEGORY_NAME, self.categories(guild))
+        if primary is None:
+            name = TICKET_CATEGORY_NAME
+            overwrites = {
+                guild.default_role: discord.PermissionOverwrite(view_channel=False)
+            }
+            support_role = guild_resources.get(guild, "support_role")
+            if support_role:
+                overwrites[support_role] = discord.PermissionOverwrite(view_channel=True, send_messages=True)
+        else:
+            n = 2
+            while f"{TICKET_CATEGORY_NAME}-{n}" in names:
+                n += 1
+            name = f"{TICKET_CATEGORY_NAME}-{n}"
+            overwrites = dict(primary.overwrites)
+
+        category = await outbound.submit(
+            PRIORITY_TICKET, ("guild", guild.id), lambda: guild.create_category(name, overwrites=overwrites)
+        )
+        shards.setdefault(category.id, set())
+        return category
+
+    def track(self, channel: discord.abc.GuildChannel):
+        shards = self._shards.get(channel.guild.id)
+        if shards is not None and channel.category_id in shards:
+            shards[channel.category_id].add(channel.id)
+
+    def channel_created(self, channel: discord.abc.GuildChannel):
+        shards = self._shards.get(channel.guild.id)
+        if shards is None:
+            return
+        if self.is_ticket_category(channel):
+            shards.setdefault(channel.id, set())
+        else:
+            self.track(channel)
+
+    def channel_updated(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+        shards = self._shards.get(after.guild.id)
+        if shards is None:
+            return
+        if isinstance(after, discord.CategoryChannel):
+            if self.is_ticket_category(after):
+                shards.setdefault(after.id, {ch.id for ch in after.channels})
+            else:
+                shards.pop(after.id, None)
+        elif before.category_id != after.category_id:
+            self._untrack(before)
+            self.track(after)
+
+    def channel_deleted(self, channel: discord.abc.GuildChannel):
+        shards = self._shards.get(channel.guild.id)
+        if shards is None:
+            return
+        if isinstance(channel, discord.CategoryChannel):
+            shards.pop(channel.id, None)
+            return
+        self._untrack(channel)
+        category = channel.category
+        if (category is not None and category.id in shards and category.name != TICKET_CATEGORY_NAME
+                and not shards[category.id] and not self._pending.get(category.id)):
+            # Reclaim the emptied overflow shard; stop handing it out before deleting it
+            del shards[category.id]
+            asyncio.create_task(self._reclaim(category))
+
+    def _untrack(self, channel: discord.abc.GuildChannel):
+        shards = self._shards.get(channel.guild.id, {})
+        if channel.category_id in shards:
+            shards[channel.category_id].discard(channel.id)
+
+    async def _reclaim(self, category: discord.CategoryChannel):
+        try:
+            await outbound.submit(
+                PRIORITY_ANNOUNCEMENT, ("guild", category.guild.id),
+                lambda: category.delete(reason="Empty ticket overflow category")
+            )
+        except discord.HTTPException as e:
+            print(f"❌ Failed to delete empty category {category.name}: {e}")
+
+    def forget(self, guild_id: int):
+        for category_id in self._shards.pop(guild_id, {}):
+            self._pending.pop(category_id, None)
+
+ticket_categories = TicketCategories()
+
+def ticket_overwrites(guild: discord.Guild, category: discord.CategoryChannel, member: discord.Member) -> dict:
+    overwrites = dict(category.overwrites) if category else {
+        guild.default_role: discord.PermissionOverwrite(view_channel=False)
+    }
+    overwrites[member] = discord.PermissionOverwrite(view_channel=True, send_messages=True)
+    overwrites[guild.me] = discord.PermissionOverwrite(view_channel=True)
+    return overwrites
+
+
+# ------------------------
+# Ticket Channel Pool
+# ------------------------
+TICKET_POOL_SIZE = int(os.getenv("TICKET_POOL_SIZE", "0"))  # warm channels per guild, 0 disables the pool
+TICKET_POOL_GUILD_SIZES = {  # per-guild overrides, e.g. TICKET_POOL_GUILD_SIZES="1234:20,5678:5"
+    int(guild_id): int(size)
+    for guild_id, size in (item.split(":") for item in os.getenv("TICKET_POOL_GUILD_SIZES", "").split(",") if item)
+}
+TICKET_POOL_REFILL_PER_MINUTE = float(os.getenv("TICKET_POOL_REFILL_PER_MINUTE", "10"))
+POOL_CHANNEL_NAME = "ticket-pool"
+
+class TicketPool:
+    """Hidden, pre-created ticket channels waiting in the ticket category.
+
+    Opening a ticket claims one and renames it, which is a single edit instead
+    of a channel creation. A background task tops each guild back up to its
+    target, creating at most TICKET_POOL_REFILL_PER_MINUTE channels a minute.
+    """
+
+    def __init__(self):
+        self._channels = {}  # guild_id -> list of pooled channel IDs
+        self._wanted = asyncio.Queue()
+        self._queued = set()
+        self._task = None
+
+    def target(self, guild_id: int) -> int:
+        return TICKET_POOL_GUILD_SIZES.get(guild_id, TICKET_POOL_SIZE)
+
+    def claim(self, guild: discord.Guild):
+        pooled = self._channels.get(guild.id, [])
+        channel = None
+        while pooled and channel is None:
+            channel = guild.get_channel(pooled.pop())
+        self.request_refill(guild.id)
+        return channel
+
+    def release(self, channel: discord.TextChannel):
+        """Put back a claimed channel that couldn't be turned into a ticket; it is still hidden."""
+        self._channels.setdefault(channel.guild.id, []).append(channel.id)
+
+    def discard(self, channel_id: int, guild_id: int):
+        pooled = self._channels.get(guild_id)
+        if pooled and channel_id in pooled:
+            pooled.remove(channel_id)
+            self.request_refill(guild_id)
+
+    def request_refill(self, guild_id: int):
+        if self.target(guild_id) > 0 and guild_id not in self._queued:
+            self._queued.add(guild_id)
+            self._wanted.put_nowait(guild_id)
+
+    def start(self):
+        if self._task is None and (TICKET_POOL_SIZE > 0 or TICKET_POOL_GUILD_SIZES):
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        await bot.wait_until_ready()
+        # Adopt channels pooled before a restart, then top up guilds that use tickets
+        for guild in bot.guilds:
+            categories = ticket_categories.categories(guild)
+            if categories:
+                self._channels[guild.id] = [
+                    c.id for category in categories for c in category.text_channels if c.name == POOL_CHANNEL_NAME
+                ]
+                self.request_refill(guild.id)
+
+        interval = 60 / TICKET_POOL_REFILL_PER_MINUTE
+        while True:
+            guild_id = await self._wanted.get()
+            self._queued.discard(guild_id)
+            guild = bot.get_guild(guild_id)
+            if guild is None:
+                self._channels.pop(guild_id, None)
+                continue
+            pooled = self._channels.setdefault(guild_id, [])
+            while len(pooled) < self.target(guild_id):
+                try:
+                    channel = await self._create(guild)
+                except discord.HTTPException as e:
+                    print(f"❌ Failed to refill ticket pool in {guild.name}: {e}")
+                    break
+                pooled.append(channel.id)
+                await asyncio.sleep(interval)
+
+    async def _create(self, guild: discord.Guild) -> discord.TextChannel:
+        overwrites = {
+            guild.default_role: discord.PermissionOverwrite(view_channel=False),
+            guild.me: discord.PermissionOverwrite(view_channel=True),
+        }
+        async with ticket_categories.slot(guild) as category:
+            # Refills are background upkeep, so they queue behind everything user-facing
+            channel = await outbound.submit(
+                PRIORITY_ANNOUNCEMENT, ("guild", guild.id),
+                lambda: guild.create_text_channel(POOL_CHANNEL_NAME, category=category, overwrites=overwrites)
+            )
+            ticket_categories.track(channel)
+        return channel
+
+ticket_pool = TicketPool()
+
+
+# ------------------------
+# Ticket Registry
+# ------------------------
+TICKET_REGISTRY_FLUSH_SECONDS = 5.0
+TICKET_WARN_AFTER_HOURS = float(os.getenv("TICKET_WARN_AFTER_HOURS", "24"))  # 0 disables the warning
+TICKET_CLOSE_AFTER_HOURS = float(os.getenv("TICKET_CLOSE_AFTER_HOURS", "48"))  # 0 disables auto-close
+TICKET_SWEEP_SECONDS = 300
+TICKET_CLOSE_RETRY_SECONDS = 3600  # wait after a failed auto-close; doubles up to TICKET_CLOSE_RETRY_MAX_SECONDS
+TICKET_CLOSE_RETRY_MAX_SECONDS = 24 * 3600
+
+state_db.add_schema("""
+CREATE TABLE IF NOT EXISTS tickets (
+    channel_id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    opener_id INTEGER NOT NULL,
+    ticket_type TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_activity REAL NOT NULL,
+    assigned_id INTEGER,
+    warned_at REAL,
+    warning_id INTEGER
+);
+""")
+
+TICKET_FIELDS = ("channel_id", "guild_id", "opener_id", "ticket_type", "created_at", "last_activity", "assigned_id", "warned_at", "warning_id")
+
+class TicketRegistry:
+    """Every open ticket and its metadata, indexed for O(1) lookups.
+
+    Tickets are keyed by channel, with secondary indexes by
+    (guild, opener, type) for duplicate checks and by guild for /tickets.
+    Activity from on_message only touches memory; changed tickets are written
+    back in one transaction every TICKET_REGISTRY_FLUSH_SECONDS.
+    """
+
+    def __init__(self, db: StateStore):
+        self.db = db
+        self.tickets = {}  # channel_id -> ticket dict (see TICKET_FIELDS)
+        self._by_key = {}  # (guild_id, opener_id, ticket_type) -> channel_id
+        self._by_guild = {}  # guild_id -> {channel_id}
+        self.closing = set()  # channel_ids with a close in progress
+        self._close_retries = {}  # channel_id -> (time of the next auto-close attempt, delay after that)
+        self._changes = WriteBehind(db, "ticket", TICKET_REGISTRY_FLUSH_SECONDS, self._collect, self._write)
+        self._sweep_task = None
+
+    def get(self, channel_id: int):
+        return self.tickets.get(channel_id)
+
+    def find(self, guild_id: int, opener_id: int, ticket_type: str):
+        channel_id = self._by_key.get((guild_id, opener_id, ticket_type))
+        return self.tickets.get(channel_id) if channel_id else None
+
+    def in_guild(self, guild_id: int) -> list:
+        return [self.tickets[channel_id] for channel_id in self._by_guild.get(guild_id, ())]
+
+    def add(self, channel: discord.TextChannel, opener_id: int, ticket_type: str) -> dict:
+        now = time.time()
+        ticket = {
+            "channel_id": channel.id, "guild_id": channel.guild.id, "opener_id": opener_id,
+            "ticket_type": ticket_type, "created_at": now, "last_activity": now,
+            "assigned_id": None, "warned_at": None, "warning_id": None,
+        }
+        self._index(ticket)
+        self._mark_dirty(channel.id)
+        return ticket
+
+    def _index(self, ticket: dict):
+        self.tickets[ticket["channel_id"]] = ticket
+        self._by_key[(ticket["guild_id"], ticket["opener_id"], ticket["ticket_type"])] = ticket["channel_id"]
+        self._by_guild.setdefault(ticket["guild_id"], set()).add(ticket["channel_id"])
+
+    def touch(self, message: discord.Message):
+        """Record activity in a ticket; the first staff reply assigns the ticket."""
+        ticket = self.tickets.get(message.channel.id)
+        if ticket is None:
+            return
+        ticket["last_activity"] = message.created_at.timestamp()
+        ticket["warned_at"] = None
+        ticket["warning_id"] = None
+        self._close_retries.pop(ticket["channel_id"], None)
+        if ticket["assigned_id"] is None and message.author.id != ticket["opener_id"] and is_staff(message.author):
+            ticket["assigned_id"] = message.author.id
+        self._mark_dirty(ticket["channel_id"])
+
+    def remove(self, channel_id: int):
+        ticket = self.tickets.pop(channel_id, None)
+        self.closing.discard(channel_id)
+        self._close_retries.pop(channel_id, None)
+        if ticket is None:
+            return
+        self._by_key.pop((ticket["guild_id"], ticket["opener_id"], ticket["ticket_type"]), None)
+        channels = self._by_guild.get(ticket["guild_id"])
+        if channels is not None:
+            channels.discard(channel_id)
+            if not channels:
+                del self._by_guild[ticket["guild_id"]]
+        self._mark_dirty(channel_id)
+
+    def auto_close_failed(self, channel_id: int):
+        """Hold off the next auto-close of a ticket, so a close that keeps failing
+        doesn't re-read its whole history every sweep."""
+        delay = self._close_retries.get(channel_id, (0, TICKET_CLOSE_RETRY_SECONDS))[1]
+        self._close_retries[channel_id] = (time.time() + delay, min(delay * 2, TICKET_CLOSE_RETRY_MAX_SECONDS))
+        return delay
+
+    def forget_guild(self, guild_id: int):
+        for channel_id in list(self._by_guild.get(guild_id, ())):
+            self.remove(channel_id)
+
+    def _mark_dirty(self, channel_id: int):
+        self._changes.mark(channel_id)
+
+    def _collect(self, channel_ids: set):
+        # Channels no longer in the registry were removed
+        rows = [tuple(self.tickets[channel_id][field] for field in TICKET_FIELDS)
+                for channel_id in channel_ids if channel_id in self.tickets]
+        removed = [(channel_id,) for channel_id in channel_ids if channel_id not in self.tickets]
+        return rows, removed
+
+    async def flush(self):
+        await self._changes.flush()
+
+    def flush_sync(self):
+        self._changes.flush_sync()
+
+    @staticmethod
+    def _write(conn, rows, removed):
+        with conn:
+            conn.executemany("DELETE FROM tickets WHERE channel_id = ?", removed)
+            conn.executemany(f"INSERT OR REPLACE INTO tickets VALUES ({', '.join('?' * len(TICKET_FIELDS))})", rows)
+
+    async def load(self):
+        def read(conn):
+            return conn.execute(f"SELECT {', '.join(TICKET_FIELDS)} FROM tickets").fetchall()
+        for row in await self.db.run(read):
+            ticket = dict(zip(TICKET_FIELDS, row))
+            # In cluster mode each worker only tracks the tickets of the guilds it owns
+            if owns_guild(ticket["guild_id"]):
+                self._index(ticket)
+
+    def start(self):
+        if self._sweep_task is None and (TICKET_WARN_AFTER_HOURS or TICKET_CLOSE_AFTER_HOURS):
+            self._sweep_task = asyncio.create_task(self._run_sweeper())
+
+    async def _run_sweeper(self):
+        await bot.wait_until_ready()
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                print(f"❌ Ticket sweep failed: {e}")
+            await asyncio.sleep(TICKET_SWEEP_SECONDS)
+
+    async def sweep(self):
+        """Warn about and then close tickets that have gone quiet."""
+        now = time.time()
+        for ticket in list(self.tickets.values()):
+            if ticket["channel_id"] in self.closing:
+                continue
+            guild = bot.get_guild(ticket["guild_id"])
+            if guild is None:
+                continue  # not available yet; don't mistake an outage for a deleted channel
+            channel = guild.get_channel(ticket["channel_id"])
+            if channel is None:
+                self.remove(ticket["channel_id"])  # deleted while the bot was offline
+                continue
+
+            # Messages sent while the bot was offline never reached on_message;
+            # the bot's own inactivity warning doesn't count as activity
+            if channel.last_message_id and channel.last_message_id != ticket["warning_id"]:
+                last_message = discord.utils.snowflake_time(channel.last_message_id).timestamp()
+                if last_message > ticket["last_activity"] + 1:
+                    ticket["last_activity"] = last_message
+                    ticket["warned_at"] = None
+                    ticket["warning_id"] = None
+                    self._mark_dirty(ticket["channel_id"])
+
+            idle_hours = (now - ticket["last_activity"]) / 3600
+            if TICKET_CLOSE_AFTER_HOURS and idle_hours >= TICKET_CLOSE_AFTER_HOURS:
+                if now >= self._close_retries.get(ticket["channel_id"], (0, 0))[0]:
+                    asyncio.create_task(auto_close_ticket(channel))
+            elif TICKET_WARN_AFTER_HOURS and idle_hours >= TICKET_WARN_AFTER_HOURS and ticket["warned_at"] is None:
+                ticket["warned_at"] = now
+                self._mark_dirty(ticket["channel_id"])
+                notice = f"<@{ticket['opener_id']}> ⏰ This ticket has been inactive for {int(idle_hours)} hours"
+                if TICKET_CLOSE_AFTER_HOURS:
+                    closes_at = int(ticket["last_activity"] + TICKET_CLOSE_AFTER_HOURS * 3600)
+                    notice += f" and will be closed automatically <t:{closes_at}:R> unless someone replies"
+                try:
+                    warning = await outbound.send(PRIORITY_TICKET, channel, notice + ".")
+                    ticket["warning_id"] = warning.id
+                    self._mark_dirty(ticket["channel_id"])
+                except discord.HTTPException as e:
+                    print(f"❌ Failed to warn inactive ticket {channel.name}: {e}")
+
+ticket_registry = TicketRegistry(state_db)
+
+metrics.gauge("bot_open_tickets", "Tickets opened by the bot that are still open", lambda: len(ticket_registry.tickets))
+
+def is_staff(member) -> bool:
+    if not isinstance(member, discord.Member) or member.bot:
+        return False
+    return member.guild_permissions.manage_messages or any(role.name == SUPPORT_ROLE_NAME for role in member.roles)
+
+@bot.event
+async def on_message(message: discord.Message):
+    if message.guild is not None and not message.author.bot:
+        ticket_registry.touch(message)
+
+@bot.tree.command(name="tickets", description="List open tickets")
+@discord.app_commands.guild_only()
+@discord.app_commands.default_permissions(manage_messages=True)
+async def list_tickets(
+    interaction: discord.Interaction,
+    opener: discord.User = None,
+    ticket_type: str = None,
+    unassigned_only: bool = False
+):
+    tickets = [
+        ticket for ticket in ticket_registry.in_guild(interaction.guild.id)
+        if (opener is None or ticket["opener_id"] == opener.id)
+        and (ticket_type is None or ticket["ticket_type"] == ticket_type.lower())
+        and (not unassigned_only or ticket["assigned_id"] is None)
+    ]
+    if not tickets:
+        await interaction.response.send_message("📭 No open tickets match.", ephemeral=True)
+        return
+
+    # Longest-idle tickets first
+    tickets.sort(key=lambda ticket: ticket["last_activity"])
+    lines = []
+    for ticket in tickets:
+        assigned = f"<@{ticket['assigned_id']}>" if ticket["assigned_id"] else "unassigned"
+        lines.append(
+            f"<#{ticket['channel_id']}> · {ticket['ticket_type']} · <@{ticket['opener_id']}> · {assigned} · "
+            f"opened <t:{int(ticket['created_at'])}:R>, last activity <t:{int(ticket['last_activity'])}:R>"
+        )
+    description = ""
+    for shown, line in enumerate(lines):
+        if len(description) + len(line) + 40 > 4096:
+            description += f"…and {len(lines) - shown} more"
+            break
+        description += line + "\n"
+
+    embed = discord.Embed(title=f"🎫 Open Tickets ({len(tickets)})", description=description, color=discord.Color.blurple())
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+# ------------------------
+# Ticket Opening
+# ------------------------
+TICKET_TYPES = {
+    "support": {
+        "label": "Support Ticket",
+        "greeting": "🎫 Support Ticket has been created! An admin will assist you shortly.",
+    },
+    "purchase": {
+        "label": "Purchase Ticket",
+        "greeting": "🛒 Purchase Ticket has been created! Please describe what you’d like to buy.",
+    },
+}
+
+tickets_in_flight = set()  # (guild_id, user_id, ticket_type) currently being created
+
+async def open_ticket(interaction: discord.Interaction, ticket_type: str):
+    guild = interaction.guild
+    label = TICKET_TYPES[ticket_type]["label"]
+    key = (guild.id, interaction.user.id, ticket_type)
+
+    # Collapse double clicks and repeat opens onto the existing ticket
+    if key in tickets_in_flight:
+        await interaction.response.send_message(f"⏳ Your **{label}** is already being created.", ephemeral=True)
+        return
+    ticket = ticket_registry.find(*key)
+    existing = guild.get_channel(ticket["channel_id"]) if ticket else None
+    if existing is not None:
+        await interaction.response.send_message(f"❌ You already have an open **{label}**: {existing.mention}", ephemeral=True)
+        return
+
+    tickets_in_flight.add(key)
+    try:
+        await interaction_jobs.dispatch(interaction, f"open_{ticket_type}", lambda job: create_ticket(job, ticket_type, key))
+    except BaseException:
+        tickets_in_flight.discard(key)
+        raise
+
+async def create_ticket(job: Job, ticket_type: str, key: tuple):
+    interaction = job.interaction
+    guild = interaction.guild
+    ticket = TICKET_TYPES[ticket_type]
+    try:
+        # The user and bot overwrites go in with the channel, so it is ready in one call
+        channel_name = f"{ticket_type}-{interaction.user.name}".replace(" ", "-")
+        channel = ticket_pool.claim(guild)
+        if channel is not None:
+            overwrites = ticket_overwrites(guild, channel.category, interaction.user)
+            try:
+                with job.step("claim_pooled_channel"):
+                    pooled = channel
+                    channel = await outbound.submit(
+                        PRIORITY_TICKET, ("channel", pooled.id),
+                        lambda: pooled.edit(name=channel_name, overwrites=overwrites)
+                    ) or pooled
+            except discord.NotFound:
+                channel = None
+            except discord.HTTPException:
+                ticket_pool.release(pooled)  # the edit didn't apply, so it is still a pool channel
+                channel = None
+        if channel is None:
+            async with ticket_categories.slot(guild) as category:
+                overwrites = ticket_overwrites(guild, category, interaction.user)
+                with job.step("create_channel"):
+                    # Routed per ticket rather than per guild, so up to TICKET_OPENS_PER_GUILD
+                    # channels are created side by side instead of queueing behind each other
+                    channel = await outbound.submit(
+                        PRIORITY_TICKET, ("ticket", *key),
+                        lambda: guild.create_text_channel(channel_name, category=category, overwrites=overwrites)
+                    )
+                ticket_categories.track(channel)
+        ticket_registry.add(channel, interaction.user.id, ticket_type)
+    finally:
+        tickets_in_flight.discard(key)
+
+    with job.step("send_greeting"):
+        await asyncio.gather(
+            outbound.send(PRIORITY_TICKET, channel, f"{interaction.user.mention} {ticket['greeting']}", view=CloseView()),
+            job.reply(f"{interaction.user.mention}, your **{ticket['label']}** has been created: {channel.mention}"),
+        )
+
+
+# ------------------------
+# Button Routes
+# ------------------------
+TICKET_OPENS_PER_GUILD = int(os.getenv("TICKET_OPENS_PER_GUILD", "4"))  # ticket channels being set up at once
+TICKET_CLOSES_PER_GUILD = int(os.getenv("TICKET_CLOSES_PER_GUILD", "2"))  # transcripts being written at once
+
+def in_guild(interaction: discord.Interaction):
+    return None if interaction.guild is not None else "❌ This button only works in a server."
+
+def ticket_not_closing(interaction: discord.Interaction):
+    return "🔒 This ticket is already being closed." if interaction.channel_id in ticket_registry.closing else None
+
+async def enter_giveaway(interaction: discord.Interaction, giveaway_id: str):
+    giveaway = await find_giveaway(giveaway_id)
+    if giveaway is None:
+        await interaction.response.send_message("❌ This giveaway has ended or doesn't exist!", ephemeral=True)
+        return
+    
+    user_id = interaction.user.id
+    
+    # Check if giveaway has ended
+    if datetime.now(timezone.utc) >= giveaway["end_time"]:
+        await interaction.response.send_message("❌ This giveaway has already ended!", ephemeral=True)
+        return
+    
+    # Check if user is already participating
+    if user_id in giveaway["participants"]:
+        await interaction.response.send_message("❌ You're already participating in this giveaway!", ephemeral=True)
+        return
+    
+    # Add user to participants; the weight is fixed by their roles when they enter
+    weight = 1
+    if giveaway["bonus_role_id"] and interaction.user.get_role(giveaway["bonus_role_id"]):
+        weight += giveaway["bonus_entries"]
+    giveaway["participants"].add(user_id, weight)
+    giveaway_store.add_entry(giveaway_id, user_id, weight)
+    
+    # Acknowledge right away; the participant count on the embed is
+    # refreshed by the debounced updater instead of on every click
+    await interaction.response.send_message("✅ You've successfully entered the giveaway! Good luck! 🍀", ephemeral=True)
+    schedule_giveaway_refresh(giveaway_id)
+
+async def close_ticket_button(interaction: discord.Interaction, custom_id: str):
+    await interaction.response.send_message("🔒 Closing ticket in 5 seconds...", ephemeral=True)
+
+    await interaction_jobs.dispatch(interaction, "close_ticket", close_ticket)
+
+# Giveaway entries are answered inline and left unbounded; ticket jobs are capped per guild
+for ticket_type in TICKET_TYPES:
+    component_router.add(ticket_type, open_ticket, checks=(in_guild,), limit=TICKET_OPENS_PER_GUILD)
+component_router.add("enter_giveaway_", enter_giveaway, prefix=True, name="enter_giveaway", checks=(in_guild,))
+component_router.add("close_ticket", close_ticket_button, checks=(in_guild, ticket_not_closing), limit=TICKET_CLOSES_PER_GUILD)
+
+async def close_ticket(job: Job):
+    await close_ticket_channel(job.interaction.channel, job.interaction.user, job.step)
+
+async def auto_close_ticket(channel: discord.TextChannel):
+    def step(name: str):
+        return metrics.timer("bot_job_step_seconds", job="auto_close_ticket", step=name)
+    try:
+        await close_ticket_channel(channel, channel.guild.me, step, reason=f"after {TICKET_CLOSE_AFTER_HOURS:g} hours of inactivity")
+    except Exception as e:
+        delay = ticket_registry.auto_close_failed(channel.id)
+        print(f"❌ Failed to auto-close ticket {channel.name}: {e}; retrying in {delay}s")
+
+async def close_ticket_channel(channel: discord.TextChannel, closed_by: discord.abc.User, step, reason: str = None):
+    """Save the transcript to the log channel and the archive, then delete the ticket.
+
+    Shared by the close button and the inactivity sweeper; ``step`` times each
+    stage like Job.step. A second close of the same channel is ignored.
+    """
+    if channel.id in ticket_registry.closing:
+        return
+    ticket_registry.closing.add(channel.id)
+    try:
+        await _close_ticket_channel(channel, closed_by, step, reason)
+    except BaseException:
+        ticket_registry.closing.discard(channel.id)
+        raise
+
+async def _close_ticket_channel(channel: discord.TextChannel, closed_by: discord.abc.User, step, reason: str):
+    transcript = TranscriptWriter(channel.name)
+    try:
+        # Collect transcript
+        with step("read_history"):
+            await transcript.write_history(channel)
+
+        # Archive first: it keeps the transcript searchable even if the upload below fails
+        with step("archive_transcript"):
+            await archive_transcript(channel, closed_by, transcript)
+
+        # Find or create logs channel
+        with step("log_channel"):
+            log_channel = await get_log_channel(channel.guild)
+
+        embed = discord.Embed(
+            title="📑 Ticket Closed",
+            description=f"Ticket `{channel.name}` closed by {closed_by.mention}" + (f" {reason}" if reason else ""),
+            color=discord.Color.red(),
+            timestamp=datetime.now(timezone.utc)
+        )
+        # Each upload must fit the guild's attachment limit. The HTML copy is several
+        # times the size of the text one, so it goes in its own message and is skipped
+        # when too large; the text transcript is always kept in the archive.
+        limit = channel.guild.filesize_limit
+        text_fits = transcript.text_size <= limit
+        html_fits = transcript.html_size <= limit
+        skipped = [name for name, fits in (("text", text_fits), ("HTML", html_fits)) if not fits]
+        if skipped:
+            embed.add_field(
+                name="Not attached",
+                value=f"The {' and '.join(skipped)} transcript is over this server's {limit // (1024 * 1024)} MB upload limit.",
+                inline=False
+            )
+
+        with step("upload_transcript"):
+            await outbound.send(PRIORITY_TICKET, log_channel, embed=embed, files=[transcript.to_file()] if text_fits else [])
+        if html_fits:
+            try:
+                with step("upload_html_transcript"):
+                    await outbound.send(PRIORITY_TICKET, log_channel, file=transcript.to_html_file())
+            except discord.HTTPException as e:
+                print(f"⚠️ Failed to upload HTML transcript for {channel.name}: {e}")
+    finally:
+        transcript.close()
+
+    # Wait 5s then delete ticket
+    await outbound.send(PRIORITY_TICKET, channel, "📌 Transcript saved. This ticket will be deleted in **5 seconds**...")
+    await asyncio.sleep(5)
+    with step("delete_channel"):
+        await outbound.submit(PRIORITY_TICKET, ("channel", channel.id), channel.delete)
+
+async def archive_transcript(channel: discord.TextChannel, closed_by: discord.abc.User, transcript: TranscriptWriter):
+    # Tickets opened before the registry existed aren't in it; fall back to the name prefix and channel age.
+    # Pooled channels are created ahead of time, so only the registry knows when the ticket was opened.
+    ticket = ticket_registry.get(channel.id) or {
+        "opener_id": None, "ticket_type": channel.name.split("-", 1)[0], "created_at": channel.created_at.timestamp(),
+    }
+    opener_id, ticket_type = ticket["opener_id"], ticket["ticket_type"]
+    meta = {
+        "guild_id": channel.guild.id,
+        "ticket_type": ticket_type if ticket_type in TICKET_TYPES else None,
+        "channel_name": channel.name,
+        "opener_id": opener_id,
+        "closer_id": closed_by.id,
+        "opened_at": ticket["created_at"],
+        "closed_at": time.time(),
+    }
+    try:
+        await transcript_archive.add(meta, transcript)
+    except Exception as e:
+        print(f"❌ Failed to archive transcript for {channel.name}: {e}")
+
+@bot.tree.command(name="transcript_search", description="Search closed ticket transcripts")
+@discord.app_commands.guild_only()
+@discord.app_commands.default_permissions(manage_messages=True)
+async def transcript_search(
+    interaction: discord.Interaction,
+    query: str,
+    opener: discord.User = None,
+    ticket_type: str = None
+):
+    await interaction_jobs.dispatch(interaction, "transcript_search", lambda job: transcript_search_job(job, query, opener, ticket_type))
+
+async def transcript_search_job(job: Job, query: str, opener: discord.User, ticket_type: str):
+    with job.step("search"):
+        results = await transcript_archive.search(
+            job.interaction.guild.id, query,
+            opener_id=opener.id if opener else None,
+            ticket_type=ticket_type.lower() if ticket_type else None
+        )
+    # The query can be up to 6000 characters; embed titles stop at 256
+    shown = query if len(query) <= TRANSCRIPT_QUERY_SHOWN else query[:TRANSCRIPT_QUERY_SHOWN - 1] + "…"
+    if not results:
+        await job.reply(f"🔍 No transcripts matched `{shown}`.")
+        return
+
+    embed = discord.Embed(title=f"🔍 Transcripts matching \"{shown}\"", color=discord.Color.blurple())
+    for result in results:
+        opened_by = f"<@{result['opener_id']}>" if result["opener_id"] else "unknown"
+        embed.add_field(
+            name=f"#{result['id']} · {result['channel_name']}",
+            value=f"Opened by {opened_by}, closed by <@{result['closer_id']}> <t:{int(result['closed_at'])}:R> "
+                  f"· {result['message_count']} messages\n> {discord.utils.escape_markdown(result['snippet']) or '…'}",
+            inline=False
+        )
+    await job.reply(embed=embed)
+
+# ========== WELCOMER SYSTEM ==========
+WELCOME_FILE = "welcomer_settings.json"  # legacy settings, imported once into the state database
+WELCOMER_FLUSH_SECONDS = 2.0  # how long changes may sit in memory before they are written
+
+state_db.add_schema("""
+CREATE TABLE IF NOT EXISTS welcomer (
+    guild_id INTEGER PRIMARY KEY,
+    config TEXT NOT NULL
+);
+""")
+
+class WelcomerStore:
+    """Per-guild welcomer settings with write-behind persistence.
+
+    Changes apply to the in-memory copy immediately. Dirty guilds are written
+    as one record each in a single background transaction, so a config write
+    costs the same however many guilds the bot serves.
+    """
+
+    def __init__(self, db: StateStore):
+        self.db = db
+        self.guilds = {}  # guild_id -> {"welcome": channel_id, "leave": channel_id, "custom": {...}}
+        self._changes = WriteBehind(db, "welcomer", WELCOMER_FLUSH_SECONDS, self._collect, self._write)
+
+    def get(self, guild_id: int) -> dict:
+        return self.guilds.get(guild_id, {})
+
+    def set_channel(self, guild_id: int, target: str, channel_id: int):
+        self._config(guild_id)[target] = channel_id
+        self._mark_dirty(guild_id)
+
+    def set_custom(self, guild_id: int, target: str, settings: dict):
+        self._config(guild_id)["custom"][target] = settings
+        self._mark_dirty(guild_id)
+
+    def _config(self, guild_id: int) -> dict:
+        return self.guilds.setdefault(guild_id, {"welcome": None, "leave": None, "custom": {}})
+
+    def _mark_dirty(self, guild_id: int):
+        self._changes.mark(guild_id)
+
+    def _collect(self, guild_ids: set):
+        return ([(guild_id, json.dumps(self.guilds[guild_id])) for guild_id in guild_ids],)
+
+    async def flush(self):
+        await self._changes.flush()
+
+    def flush_sync(self):
+        self._changes.flush_sync()
+
+    @staticmethod
+    def _write(conn, rows):
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO welcomer VALUES (?, ?)", rows)
+
+    async def load(self):
+        def read(conn):
+            rows = conn.execute("SELECT guild_id, config FROM welcomer").fetchall()
+            if not rows and os.path.exists(WELCOME_FILE):
+                rows = self._import_legacy(conn)
+            return {guild_id: json.loads(config) for guild_id, config in rows}
+        self.guilds = await self.db.run(read)
+
+    @staticmethod
+    def _import_legacy(conn):
+        with open(WELCOME_FILE, "r") as f:
+            legacy = json.load(f)
+        guilds = {}
+        for target in ("welcome", "leave"):
+            for gid, channel_id in legacy.get(target, {}).items():
+                guilds.setdefault(int(gid), {"welcome": None, "leave": None, "custom": {}})[target] = channel_id
+        for gid, custom in legacy.get("custom", {}).items():
+            guilds.setdefault(int(gid), {"welcome": None, "leave": None, "custom": {}})["custom"] = custom
+        rows = [(guild_id, json.dumps(config)) for guild_id, config in guilds.items()]
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO welcomer VALUES (?, ?)", rows)
+        print(f"✅ Imported welcomer settings for {len(rows)} guild(s) from {WELCOME_FILE}")
+        return rows
+
+welcomer_store = WelcomerStore(state_db)
+
+WELCOMER_DEFAULTS = {
+    "welcome": {
+        "title": "🎉 Welcome to {server}!",
+        "description": "Hey {user}, glad to have you here! You are member #{member_count}.",
+        "color": discord.Color.green(),
+    },
+    "leave": {
+        "title": "👋 Goodbye from {server}",
+        "description": "{user_name} has left the server. We now have {member_count} members.",
+        "color": discord.Color.red(),
+    },
+}
+
+# Helper: format placeholders
+PLACEHOLDER_PATTERN = re.compile(r"\{(user|user_name|server|member_count)\}")
+
+def compile_template(text: str) -> str:
+    """Turn a welcomer template into a str.format string, escaping everything but the placeholders."""
+    parts = PLACEHOLDER_PATTERN.split(text)
+    return "".join(
+        "{" + part + "}" if i % 2 else part.replace("{", "{{").replace("}", "}}")
+        for i, part in enumerate(parts)
+    )
+
+compiled_templates = {}  # (guild_id, target) -> (title format, description format)
+
+def get_templates(guild_id: int, target: str, settings: dict):
+    templates = compiled_templates.get((guild_id, target))
+    if templates is None:
+        defaults = WELCOMER_DEFAULTS[target]
+        templates = (
+            compile_template(settings.get("title", defaults["title"])),
+            compile_template(settings.get("description", defaults["description"])),
+        )
+        compiled_templates[(guild_id, target)] = templates
+    return templates
+
+def placeholder_values(guild: discord.Guild, user: discord.abc.User) -> dict:
+    return {
+        "user": user.mention,
+        "user_name": user.name,
+        "server": guild.name,
+        "member_count": guild.member_count,
+    }
+
+# --- Slash Commands ---
+
+@bot.tree.command(name="welcomer_set", description="Set the welcome channel")
+async def welcomer_set(interaction: discord.Interaction, channel: discord.TextChannel):
+    welcomer_store.set_channel(interaction.guild.id, "welcome", channel.id)
+    await interaction.response.send_message(f"✅ Welcome channel set to {channel.mention}")
+
+@bot.tree.command(name="leave_set", description="Set the leave channel")
+async def leave_set(interaction: discord.Interaction, channel: discord.TextChannel):
+    welcomer_store.set_channel(interaction.guild.id, "leave", channel.id)
+    await interaction.response.send_message(f"✅ Leave channel set to {channel.mention}")
+
+@bot.tree.command(name="customize", description="Customize welcome/leave messages")
+async def customize(
+    interaction: discord.Interaction,
+    target: str,
+    title: str,
+    description: str,
+    image_url: str = None
+):
+    if target.lower() not in ["welcome", "leave"]:
+        await interaction.response.send_message("❌ Please choose either 'welcome' or 'leave'", ephemeral=True)
+        return
+
+    welcomer_store.set_custom(interaction.guild.id, target.lower(), {
+        "title": title,
+        "description": description,
+        "image": image_url or None
+    })
+    compiled_templates.pop((interaction.guild.id, target.lower()), None)
+    await interaction.response.send_message(f"✅ Customized {target.lower()} embed successfully!\n\n📌 Placeholders you can use:\n`{user}`, `{user_name}`, `{server}`, `{member_count}`")
+
+# --- Burst Mode ---
+WELCOME_BURST_THRESHOLD = int(os.getenv("WELCOME_BURST_THRESHOLD", "10"))  # events per window before batching starts
+WELCOME_BURST_WINDOW = float(os.getenv("WELCOME_BURST_WINDOW", "10"))  # seconds
+WELCOME_BURST_NAMES = 5  # members named in a batched embed before "and N others"
+
+class AnnouncementBatcher:
+    """Folds welcome or leave announcements into one embed per window during bursts.
+
+    While a guild stays under WELCOME_BURST_THRESHOLD events per window every
+    member gets their own embed; above it, members are collected and announced
+    together once the window closes.
+    """
+
+    def __init__(self, target: str):
+        self.target = target
+        self._recent = {}  # guild_id -> deque of recent event times
+        self._batches = {}  # guild_id -> members waiting for the batched embed
+
+    def add(self, guild: discord.Guild, user: discord.abc.User) -> bool:
+        """Record an event; returns False if the user was queued for a batch."""
+        guild_id = guild.id
+        now = time.monotonic()
+        recent = self._recent.setdefault(guild_id, deque())
+        recent.append(now)
+        while recent and recent[0] <= now - WELCOME_BURST_WINDOW:
+            recent.popleft()
+
+        if guild_id in self._batches:
+            self._batches[guild_id].append(user)
+            return False
+        if len(recent) > WELCOME_BURST_THRESHOLD:
+            self._batches[guild_id] = [user]
+            asyncio.create_task(self._flush_later(guild))
+            return False
+        return True
+
+    async def _flush_later(self, guild: discord.Guild):
+        await asyncio.sleep(WELCOME_BURST_WINDOW)
+        members = self._batches.pop(guild.id, [])
+        recent = self._recent.get(guild.id)
+        if recent and recent[-1] <= time.monotonic() - WELCOME_BURST_WINDOW:
+            del self._recent[guild.id]
+        if members:
+            await send_announcement(guild, self.target, members)
+
+announcement_batchers = {target: AnnouncementBatcher(target) for target in WELCOMER_DEFAULTS}
+
+def join_members(items: list, total: int) -> str:
+    if total > len(items):
+        return f"{', '.join(items)} and {total - len(items)} others"
+    if len(items) > 1:
+        return f"{', '.join(items[:-1])} and {items[-1]}"
+    return items[0]
+
+async def send_announcement(guild: discord.Guild, target: str, members: list):
+    config = welcomer_store.get(guild.id)
+    channel = guild.get_channel(config.get(target) or 0)
+    if channel is None:
+        return
+    settings = config["custom"].get(target, {})
+    title, description = get_templates(guild.id, target, settings)
+
+    if len(members) == 1:
+        member = members[0]
+        values = placeholder_values(guild, member)
+        thumbnail = member.avatar.url if member.avatar else member.default_avatar.url
+    else:
+        named = members[:WELCOME_BURST_NAMES]
+        values = {
+            "user": join_members([m.mention for m in named], len(members)),
+            "user_name": join_members([m.name for m in named], len(members)),
+            "server": guild.name,
+            "member_count": guild.member_count,
+        }
+        thumbnail = guild.icon.url if guild.icon else None
+
+    embed = discord.Embed(
+        title=title.format_map(values),
+        description=description.format_map(values),
+        color=WELCOMER_DEFAULTS[target]["color"]
+    )
+    embed.set_thumbnail(url=thumbnail)
+    if settings.get("image"):
+        embed.set_image(url=settings["image"])
+    await outbound.send(PRIORITY_ANNOUNCEMENT, channel, embed=embed)
+
+async def announce_member(guild: discord.Guild, user: discord.abc.User, target: str):
+    if not welcomer_store.get(guild.id).get(target):
+        return
+    if announcement_batchers[target].add(guild, user):
+        await send_announcement(guild, target, [user])
+
+# --- Events ---
+
+@bot.event
+async def on_member_join(member: discord.Member):
+    await announce_member(member.guild, member, "welcome")
+
+# The raw event fires whether or not the member was cached, so leave messages
+# also work under the lean cache profile
+@bot.event
+async def on_raw_member_remove(payload: discord.RawMemberRemoveEvent):
+    guild = bot.get_guild(payload.guild_id)
+    if guild is not None:
+        await announce_member(guild, payload.user, "leave")
+
+# Restore persisted state and sync commands before connecting to the gateway
+@bot.event
+async def setup_hook():
+    loop_watchdog.start()
+    # The cluster supervisor stops workers with SIGTERM; close cleanly so buffered state gets flushed
+    with contextlib.suppress(NotImplementedError):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(bot.close()))
+    # Panels and close buttons sent before a restart keep routing to component_router
+    bot.add_view(TicketPanelView())
+    bot.add_view(CloseView())
+    await start_health_server()
+    await welcomer_store.load()
+    await restore_giveaways()
+    await ticket_registry.load()
+    ticket_registry.start()
+    ticket_pool.start()
+    await transcript_renderer.start()
+    # Commands are global, so only the first cluster worker uploads them
+    if WORKER_ID == 0:
+        await sync_commands()
+
+# ------------------------
+# Command Sync
+# ------------------------
+DEV_GUILD_IDS = [int(guild_id) for guild_id in os.getenv("DEV_GUILD_IDS", "").split(",") if guild_id]
+FORCE_COMMAND_SYNC = os.getenv("FORCE_COMMAND_SYNC", "0") == "1"
+
+def command_tree_hash(guild: discord.abc.Snowflake = None) -> str:
+    payload = sorted((command.to_dict(bot.tree) for command in bot.tree.get_commands(guild=guild)), key=lambda c: c["name"])
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+async def sync_commands():
+    """Upload the command tree only when its definitions changed since the last sync.
+
+    With DEV_GUILD_IDS set, commands are copied to and synced in those guilds
+    instead of globally, which Discord applies immediately.
+    """
+    targets = [discord.Object(id=guild_id) for guild_id in DEV_GUILD_IDS] or [None]
+    for guild in targets:
+        if guild is not None:
+            bot.tree.copy_global_to(guild=guild)
+        where = f"guild {guild.id}" if guild else "global"
+        key = f"command_tree_hash:{bot.application_id}:{where}"
+        digest = command_tree_hash(guild)
+        if not FORCE_COMMAND_SYNC and await state_db.get_meta(key) == digest:
+            print(f"✅ Commands unchanged ({where}), skipping sync")
+            continue
+        try:
+            started = time.monotonic()
+            synced = await bot.tree.sync(guild=guild)
+        except discord.HTTPException as e:
+            print(f"❌ Failed to sync commands ({where}): {e}")
+            continue
+        await state_db.set_meta(key, digest)
+        print(f"✅ Synced {len(synced)} command(s) ({where}) in {time.monotonic() - started:.1f}s")
+
+
+# ------------------------
+# Cluster Mode
+# ------------------------
+CLUSTER_WORKERS = int(os.getenv("CLUSTER_WORKERS", "1"))  # worker processes; 1 runs the bot in this process
+CLUSTER_SHARDS = int(os.getenv("CLUSTER_SHARDS", "0"))  # total shards; 0 asks Discord for its recommendation
+CLUSTER_RESTART_MAX_DELAY = 60  # seconds; crash-looping workers back off up to this
+
+def recommended_shard_count(token: str) -> int:
+    request = urllib.request.Request(
+        "https://discord.com/api/v10/gateway/bot",
+        headers={"Authorization": f"Bot {token}", "User-Agent": "DiscordBot (ticketsystem, 1.0)"}
+    )
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.load(response)["shards"]
+
+def run_cluster(token: str, workers: int, shard_count: int):
+    """Supervise `workers` bot processes that split `shard_count` shards between them.
+
+    Each worker gets a contiguous range of shard IDs through the environment and
+    shares giveaways, tickets and welcomer settings through the state database.
+    Workers that exit are restarted with exponential backoff.
+    """
+    shard_count = max(shard_count, workers)
+    ranges = [list(range(shard_count * i // workers, shard_count * (i + 1) // workers)) for i in range(workers)]
+    launcher = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+    def spawn(worker_id: int) -> subprocess.Popen:
+        env = dict(
+            os.environ,
+            BOT_WORKER_ID=str(worker_id),
+            BOT_SHARD_IDS=",".join(map(str, ranges[worker_id])),
+            BOT_SHARD_COUNT=str(shard_count),
+        )
+        print(f"🚀 Starting worker {worker_id} with shards {ranges[worker_id]}")
+        return subprocess.Popen([sys.executable, launcher], env=env)
+
+    procs = {worker_id: spawn(worker_id) for worker_id in range(workers)}
+    started = {worker_id: time.monotonic() for worker_id in procs}
+    delays = {worker_id: 1 for worker_id in procs}
+    restart_at = {}
+
+    stopping = False
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while not stopping:
+        time.sleep(1)
+        now = time.monotonic()
+        for worker_id, proc in procs.items():
+            if worker_id in restart_at:
+                if now >= restart_at[worker_id]:
+                    del restart_at[worker_id]
+                    procs[worker_id] = spawn(worker_id)
+                    started[worker_id] = now
+                continue
+            code = proc.poll()
+            if code is None:
+                continue
+            # A worker that stayed up for a while gets a fresh backoff
+            if now - started[worker_id] > CLUSTER_RESTART_MAX_DELAY:
+                delays[worker_id] = 1
+            print(f"❌ Worker {worker_id} exited with code {code}; restarting in {delays[worker_id]}s")
+            restart_at[worker_id] = now + delays[worker_id]
+            delays[worker_id] = min(delays[worker_id] * 2, CLUSTER_RESTART_MAX_DELAY)
+
+    for proc in procs.values():
+        if proc.poll() is None:
+            proc.terminate()
+    for proc in procs.values():
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+# ------------------------
+# Run Bot
+# ------------------------
+def main():
+    """Run the bot, or the cluster supervisor; started by main.py."""
+    token = os.getenv("DISCORD_TOKEN")
+    if CLUSTER_WORKERS > 1 and not SHARD_IDS:
+        run_cluster(token, CLUSTER_WORKERS, CLUSTER_SHARDS or recommended_shard_count(token))
+    else:
+        bot.run(token)
+
+        # Write out any buffered state once the bot has shut down
+        giveaway_store.flush_sync()
+        welcomer_store.flush_sync()
+        ticket_registry.flush_sync()
+        transcript_renderer.shutdown()
+        state_db.close()
+        transcript_db.close()
@@ -0,0 +1,169 @@
+"""Gateway cache benchmark for app.py's cache profiles.
+
+Replays a synthetic gateway session -- N guilds with M members each, plus a few
+messages per guild -- straight into the bot's connection state, without
+connecting to Discord. Each cache profile runs in a fresh process so resident
+memory is measured in isolation, and the table shows RSS growth and the time
+spent building the caches.
+
+    python bench/gateway_cache.py --guilds 200 --members 2000
+    python bench/gateway_cache.py --profiles lean --guilds 1000 --members 500
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JOINED_AT = "2024-01-01T00:00:00+00:00"
+BOT_USER_ID = 1
+
+
+def rss_kb() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    # Peak rather than current RSS, but the best we have off Linux (kB on Linux, bytes on macOS)
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss // 1024 if sys.platform == "darwin" else maxrss
+
+
+def user_payload(user_id: int) -> dict:
+    return {"id": str(user_id), "username": f"user{user_id}", "discriminator": "0", "avatar": None, "global_name": None}
+
+
+def member_payload(user_id: int) -> dict:
+    return {"user": user_payload(user_id), "roles": [], "joined_at": JOINED_AT, "deaf": False, "mute": False, "flags": 0}
+
+
+def guild_payload(guild_id: int, members: int) -> dict:
+    first_user = guild_id * 1_000_000
+    return {
+        "id": str(guild_id),
+        "name": f"guild-{guild_id}",
+        "owner_id": str(first_user),
+        "member_count": members + 1,
+        "features": [],
+        "emojis": [],
+        "stickers": [],
+        "roles": [{
+            "id": str(guild_id), "name": "@everyone", "permissions": "0", "position": 0,
+            "color": 0, "hoist": False, "managed": False, "mentionable": False,
+        }],
+        "channels": [
+            {"id": str(guild_id + 1), "type": 0, "name": "general", "position": 0, "permission_overwrites": []},
+            {"id": str(guild_id + 2), "type": 4, "name": "TICKETS", "position": 1, "permission_overwrites": []},
+        ],
+        "members": [member_payload(BOT_USER_ID)] + [member_payload(first_user + i) for i in range(members)],
+    }
+
+
+def message_payload(guild_id: int, message_id: int, author_id: int) -> dict:
+    return {
+        "id": str(message_id),
+        "channel_id": str(guild_id + 1),
+        "guild_id": str(guild_id),
+        "author": user_payload(author_id),
+        "member": {"roles": [], "joined_at": JOINED_AT, "deaf": False, "mute": False, "flags": 0},
+        "content": "hello there",
+        "timestamp": JOINED_AT,
+        "edited_timestamp": None,
+        "tts": False,
+        "mention_everyone": False,
+        "mentions": [],
+        "mention_roles": [],
+        "attachments": [],
+        "embeds": [],
+        "pinned": False,
+        "type": 0,
+    }
+
+
+async def replay(args) -> dict:
+    sys.path.insert(0, ROOT)
+    started = time.perf_counter()
+    rss_start = rss_kb()
+    import app
+    import_seconds = time.perf_counter() - started
+    rss_imported = rss_kb()
+
+    from discord.user import ClientUser
+    await app.bot._async_setup_hook()  # binds the client to this loop, as login() would
+    state = app.bot._connection
+    state.user = ClientUser(state=state, data=user_payload(BOT_USER_ID))
+
+    replay_seconds = 0.0
+    message_id = 10**17
+    for n in range(args.guilds):
+        guild_id = (n + 1) * 10**12
+        payload = guild_payload(guild_id, args.members)
+        t = time.perf_counter()
+        state._add_guild_from_data(payload)
+        for i in range(args.messages):
+            message_id += 1
+            state.parse_message_create(message_payload(guild_id, message_id, guild_id * 1_000_000 + i % max(args.members, 1)))
+        replay_seconds += time.perf_counter() - t
+        del payload
+    await asyncio.sleep(0)  # let dispatched listeners run
+    gc.collect()
+
+    guilds = app.bot.guilds
+    return {
+        "profile": app.CACHE_PROFILE,
+        "guilds": len(guilds),
+        "cached_members": sum(len(g.members) for g in guilds),
+        "cached_messages": len(app.bot.cached_messages),
+        "import_seconds": round(import_seconds, 3),
+        "replay_seconds": round(replay_seconds, 3),
+        "rss_import_mb": round((rss_imported - rss_start) / 1024, 1),
+        "rss_cache_mb": round((rss_kb() - rss_imported) / 1024, 1),
+        "rss_total_mb": round(rss_kb() / 1024, 1),
+    }
+
+
+def run_profile(profile: str, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, BOT_CACHE_PROFILE=profile, STATE_DB=os.path.join(tmp, "bench.db"))
+        cmd = [sys.executable, os.path.abspath(__file__), "--child",
+               "--guilds", str(args.guilds), "--members", str(args.members), "--messages", str(args.messages)]
+        result = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(f"profile {profile!r} failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guilds", type=int, default=100)
+    parser.add_argument("--members", type=int, default=1000, help="members per guild")
+    parser.add_argument("--messages", type=int, default=50, help="messages replayed per guild")
+    parser.add_argument("--profiles", default="default,lean")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(replay(args))))
+        return
+
+    print(f"Replaying {args.guilds} guilds x {args.members} members, {args.messages} messages per guild\n")
+    columns = ["profile", "cached_members", "cached_messages", "import_seconds", "replay_seconds",
+               "rss_import_mb", "rss_cache_mb", "rss_total_mb"]
+    rows = [run_profile(profile, args) for profile in args.profiles.split(",")]
+    widths = [max(len(c), *(len(str(r[c])) for r in rows)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row[c]).ljust(w) for c, w in zip(columns, widths)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,514 @@
+"""Offline load test for app.py's handlers.
+
+Runs the real bot code against a local stand-in for Discord: an aiohttp
+server plays the REST API, with configurable latency and injected 429s.
+discord.py is pointed at it by patching Route.BASE. Gateway events
+(guilds, interactions, member joins and the channel events that follow
+REST calls) are fed straight into the client's parse_* handlers. Each
+scenario runs in a fresh process. The table shows throughput, p50/p99
+latency, API calls, 429s, the worst event-loop lag and peak RSS.
+
+    python bench/loadtest.py
+    python bench/loadtest.py --scenarios ticket-open --users 1000 --latency-ms 80 --ratelimit 0.02
+    python bench/loadtest.py --scenarios ticket-close --messages 50000 --calls
+
+Scenarios:
+    giveaway-storm  --entries users click "Enter Giveaway" on one giveaway, which is then ended
+    ticket-open     --users users open a support ticket, spread over --guilds guilds
+    ticket-close    a ticket with --messages messages of history is closed
+    join-raid       --joins members join one guild that has a welcome channel
+
+"ack" is the time from the event to the interaction's first response and
+"done" the time to its final result. For ticket-open that is the followup,
+for ticket-close the transcript upload, and for join-raid the end of the
+on_member_join handler. The stand-in shares the bot's process and event
+loop, so its own small cost is included in the numbers.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from aiohttp import web
+
+from gateway_cache import JOINED_AT, BOT_USER_ID, guild_payload, member_payload, user_payload
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APPLICATION_ID = BOT_USER_ID
+FIRST_GUILD_ID = 10**12
+HOST_USER_ID = 42
+SCENARIOS = ("giveaway-storm", "ticket-open", "ticket-close", "join-raid")
+
+
+def peak_rss_mb() -> float:
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round((maxrss / 1024 / 1024 if sys.platform == "darwin" else maxrss / 1024), 1)
+
+
+def percentile(values: list, q: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, round(q * (len(values) - 1)))]
+
+
+def message_payload(channel_id: int, message_id: int, author_id: int, content: str = "hello there") -> dict:
+    return {
+        "id": str(message_id),
+        "channel_id": str(channel_id),
+        "author": user_payload(author_id),
+        "content": content,
+        "timestamp": JOINED_AT,
+        "edited_timestamp": None,
+        "tts": False,
+        "mention_everyone": False,
+        "mentions": [],
+        "mention_roles": [],
+        "attachments": [],
+        "embeds": [],
+        "pinned": False,
+        "type": 0,
+    }
+
+
+def json_response(data, status: int = 200, headers: dict = None) -> web.Response:
+    # discord.py only decodes bodies whose content type is exactly application/json, without a charset
+    return web.Response(body=json.dumps(data).encode(), status=status, headers={**(headers or {}), "Content-Type": "application/json"})
+
+
+class FakeDiscord:
+    """Local stand-in for Discord's REST API and gateway.
+
+    REST calls are counted by route and answered after a random delay of
+    0.5-1.5x the configured latency. A --ratelimit fraction of them is
+    answered with a 429 that discord.py has to wait out and retry. Calls that
+    create, edit or delete channels are echoed back as gateway events, as
+    Discord does.
+    """
+
+    def __init__(self, args):
+        self.latency = args.latency_ms / 1000
+        self.ratelimit = args.ratelimit
+        self.rng = random.Random(args.seed)
+        self.state = None
+        self.calls = Counter()  # "METHOD /route/{id}" -> requests
+        self.limited = 0
+        self.channels = {}  # channel_id -> channel payload
+        self.history = {}  # channel_id -> number of messages in its history
+        self.injected = {}  # interaction id -> time the interaction arrived
+        self.acks = {}  # interaction id -> time of its first response
+        self.followups = {}  # interaction id -> time of its first followup
+        self.uploads = []  # times of messages sent with files
+        self.deleted = set()
+        self._next_id = 9 * 10**17
+        self._routes = {
+            ("GET", "/users/@me"): self.get_me,
+            ("GET", "/oauth2/applications/@me"): self.get_application,
+            ("PUT", "/applications/{id}/commands"): self.put_commands,
+            ("POST", "/interactions/{id}/{token}/callback"): self.interaction_callback,
+            ("POST", "/webhooks/{id}/{token}"): self.followup,
+            ("GET", "/webhooks/{id}/{token}/messages/@original"): self.original_response,
+            ("POST", "/guilds/{id}/channels"): self.create_channel,
+            ("PATCH", "/channels/{id}"): self.edit_channel,
+            ("DELETE", "/channels/{id}"): self.delete_channel,
+            ("GET", "/channels/{id}/messages"): self.get_history,
+            ("POST", "/channels/{id}/messages"): self.send_message,
+            ("GET", "/channels/{id}/messages/{id}"): self.get_message,
+            ("PATCH", "/channels/{id}/messages/{id}"): self.get_message,
+        }
+
+    def new_id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    async def start(self) -> str:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_route("*", "/api/v10/{path:.*}", self.handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = runner.addresses[0][:2]
+        return f"http://{host}:{port}/api/v10"
+
+    async def handle(self, request: web.Request):
+        path = "/" + request.match_info["path"]
+        route = re.sub(r"/\d+", "/{id}", re.sub(r"/tok-\d+", "/{token}", path))
+        self.calls[f"{request.method} {route}"] += 1
+        if request.content_type.startswith("multipart/"):
+            form = await request.post()
+            body, has_files = json.loads(form["payload_json"]), True
+        else:
+            raw = await request.read()
+            body, has_files = (json.loads(raw) if raw else {}), False
+        if self.latency:
+            await asyncio.sleep(self.latency * self.rng.uniform(0.5, 1.5))
+
+        if self.ratelimit and self.rng.random() < self.ratelimit:
+            self.limited += 1
+            retry_after = round(self.rng.uniform(0.05, 0.5), 3)
+            return json_response(
+                {"message": "You are being rate limited.", "retry_after": retry_after, "global": False},
+                status=429, headers={"Retry-After": str(retry_after), "Via": "1.1 google", "X-RateLimit-Scope": "user"},
+            )
+
+        handler = self._routes.get((request.method, route))
+        if handler is None:
+            return json_response({"message": f"Unknown route {request.method} {route}", "code": 0}, status=404)
+        ids = [int(n) for n in re.findall(r"(?<=/)\d+", re.sub(r"/tok-\d+", "", path))]
+        token = re.search(r"tok-(\d+)", path)
+        result = handler(request, body, ids, int(token.group(1)) if token else None, has_files)
+        if result is None:
+            return web.Response(status=204)
+        return json_response(result)
+
+    # ---- REST handlers
+
+    def get_me(self, request, body, ids, interaction_id, has_files):
+        return {**user_payload(BOT_USER_ID), "bot": True}
+
+    def get_application(self, request, body, ids, interaction_id, has_files):
+        return {
+            "id": str(APPLICATION_ID), "name": "bench", "description": "", "icon": None, "bot_public": True,
+            "bot_require_code_grant": False, "owner": user_payload(HOST_USER_ID), "verify_key": "", "flags": 0,
+        }
+
+    def put_commands(self, request, body, ids, interaction_id, has_files):
+        return []
+
+    def interaction_callback(self, request, body, ids, interaction_id, has_files):
+        self.acks.setdefault(interaction_id, time.perf_counter())
+        return {"interaction": {"id": str(interaction_id), "type": 3}}
+
+    def followup(self, request, body, ids, interaction_id, has_files):
+        self.followups.setdefault(interaction_id, time.perf_counter())
+        return message_payload(0, self.new_id(), BOT_USER_ID, body.get("content") or "")
+
+    def original_response(self, request, body, ids, interaction_id, has_files):
+        return message_payload(0, interaction_id + 1, BOT_USER_ID)
+
+    def create_channel(self, request, body, ids, interaction_id, has_files):
+        channel = {
+            "id": str(self.new_id()), "guild_id": str(ids[0]), "type": body.get("type", 0), "name": body["name"],
+            "position": len(self.channels), "parent_id": body.get("parent_id"),
+            "permission_overwrites": [
+                {**overwrite, "allow": str(overwrite["allow"]), "deny": str(overwrite["deny"])}
+                for overwrite in body.get("permission_overwrites", [])
+            ],
+        }
+        self.add_channel(channel)
+        return channel
+
+    def edit_channel(self, request, body, ids, interaction_id, has_files):
+        channel = self.channels[ids[0]]
+        if "name" in body:
+            channel["name"] = body["name"]
+        if "permission_overwrites" in body:
+            channel["permission_overwrites"] = [
+                {**overwrite, "allow": str(overwrite["allow"]), "deny": str(overwrite["deny"])}
+                for overwrite in body["permission_overwrites"]
+            ]
+        self.state.parse_channel_update(channel)
+        return channel
+
+    def delete_channel(self, request, body, ids, interaction_id, has_files):
+        channel = self.channels.pop(ids[0])
+        self.deleted.add(ids[0])
+        self.state.parse_channel_delete(channel)
+        return channel
+
+    def get_history(self, request, body, ids, interaction_id, has_files):
+        # Discord returns the page newest first, whichever direction it was fetched in
+        channel_id = ids[0]
+        total = self.history.get(channel_id, 0)
+        limit = int(request.query.get("limit", 50))
+        after = int(request.query.get("after", 0))
+        start = max(after - channel_id, 0) + 1
+        end = min(start + limit, total + 1)
+        return [message_payload(channel_id, channel_id + n, HOST_USER_ID + n % 7, f"message {n}") for n in range(end - 1, start - 1, -1)]
+
+    def send_message(self, request, body, ids, interaction_id, has_files):
+        if has_files:
+            self.uploads.append(time.perf_counter())
+        return message_payload(ids[0], self.new_id(), BOT_USER_ID, body.get("content") or "")
+
+    def get_message(self, request, body, ids, interaction_id, has_files):
+        return message_payload(ids[0], ids[1], BOT_USER_ID)
+
+    # ---- Gateway side
+
+    def add_channel(self, channel: dict, history: int = 0):
+        self.channels[int(channel["id"])] = channel
+        if history:
+            self.history[int(channel["id"])] = history
+        self.state.parse_channel_create(channel)
+
+    def interaction(self, kind: int, guild_id: int, channel_id: int, user_id: int, data: dict, **extra) -> int:
+        interaction_id = self.new_id()
+        self.injected[interaction_id] = time.perf_counter()
+        self.state.parse_interaction_create({**extra,
+            "id": str(interaction_id), "application_id": str(APPLICATION_ID), "type": kind,
+            "token": f"tok-{interaction_id}", "version": 1, "guild_id": str(guild_id), "channel_id": str(channel_id),
+            "channel": {"id": str(channel_id), "type": 0},
+            "member": {**member_payload(user_id), "permissions": "8"}, "data": data, "locale": "en-US",
+            "guild_locale": "en-US", "app_permissions": "8", "entitlements": [], "attachment_size_limit": 8 * 1024 * 1024,
+            "authorizing_integration_owners": {}, "context": 0,
+        })
+        return interaction_id
+
+    def click(self, guild_id: int, channel_id: int, user_id: int, custom_id: str, message_id: int = None) -> int:
+        # Views are looked up by the clicked message first, then by custom_id alone
+        message = message_payload(channel_id, message_id or self.new_id(), BOT_USER_ID)
+        return self.interaction(3, guild_id, channel_id, user_id, {"custom_id": custom_id, "component_type": 2}, message=message)
+
+    def command(self, guild_id: int, channel_id: int, user_id: int, name: str, **options) -> int:
+        typed = [{"name": k, "type": 4 if isinstance(v, int) else 3, "value": v} for k, v in options.items()]
+        return self.interaction(2, guild_id, channel_id, user_id, {"id": "1", "name": name, "type": 1, "options": typed})
+
+    def latencies(self, interaction_ids: list, finished: dict) -> list:
+        return [finished[i] - self.injected[i] for i in interaction_ids if i in finished]
+
+
+async def wait_for(condition, timeout: float, what: str):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError(f"timed out waiting for {what}")
+        await asyncio.sleep(0.01)
+
+
+async def settle(app, timeout: float):
+    """Wait until the bot has nothing left queued or running."""
+    def idle():
+        return (
+            not any(app.outbound.depth) and not any(app.outbound.in_flight)
+            and not app.interaction_jobs.running and not app.giveaway_refreshes
+            and not any(batcher._batches for batcher in app.announcement_batchers.values())
+        )
+    await wait_for(lambda: idle(), timeout, "the bot to go idle")
+    await asyncio.sleep(0.05)
+    await wait_for(lambda: idle(), timeout, "the bot to go idle")
+
+
+# ---- Scenarios
+
+async def giveaway_storm(fake: FakeDiscord, app, args) -> dict:
+    guild_id = FIRST_GUILD_ID
+    fake.command(guild_id, guild_id + 1, HOST_USER_ID, "giveaway",
+                 title="Bench", description="Load test", duration_minutes=60, winners=3)
+    await wait_for(lambda: app.active_giveaways and all(g["message_id"] for g in app.active_giveaways.values()),
+                   args.timeout, "the giveaway to start")
+    giveaway_id = next(iter(app.active_giveaways))
+    message_id = app.active_giveaways[giveaway_id]["message_id"]
+
+    started = time.perf_counter()
+    entries = []
+    for n in range(args.entries):
+        entries.append(fake.click(guild_id, guild_id + 1, 10**9 + n, f"enter_giveaway_{giveaway_id}", message_id))
+        if n % args.burst == args.burst - 1:
+            await asyncio.sleep(0)
+    await wait_for(lambda: all(i in fake.acks for i in entries), args.timeout, "entry acknowledgements")
+    seconds = time.perf_counter() - started
+
+    await settle(app, args.timeout)
+    ended = time.perf_counter()
+    await app.end_giveaway(giveaway_id)
+    acks = fake.latencies(entries, fake.acks)
+    return {"events": len(entries), "seconds": seconds, "ack": acks, "done": acks,
+            "notes": f"end_giveaway {time.perf_counter() - ended:.3f}s"}
+
+
+async def ticket_open(fake: FakeDiscord, app, args) -> dict:
+    guild_ids = [FIRST_GUILD_ID * (n + 1) for n in range(args.guilds)]
+    started = time.perf_counter()
+    opens = []
+    for n in range(args.users):
+        guild_id = guild_ids[n % len(guild_ids)]
+        opens.append(fake.click(guild_id, guild_id + 1, 10**9 + n, "support"))
+        if n % args.burst == args.burst - 1:
+            await asyncio.sleep(0)
+    await wait_for(lambda: all(i in fake.followups for i in opens), args.timeout, "ticket followups")
+    seconds = time.perf_counter() - started
+    await settle(app, args.timeout)
+    return {"events": len(opens), "seconds": seconds,
+            "ack": fake.latencies(opens, fake.acks), "done": fake.latencies(opens, fake.followups),
+            "notes": f"{len(app.ticket_registry.tickets)} tickets open, pool {app.TICKET_POOL_SIZE}"}
+
+
+async def ticket_close(fake: FakeDiscord, app, args) -> dict:
+    guild_id = FIRST_GUILD_ID
+    channel_id = fake.new_id()
+    fake._next_id += args.messages + 1  # the history's message IDs follow the channel ID
+    fake.add_channel({
+        "id": str(channel_id), "guild_id": str(guild_id), "type": 0, "name": "support-bench",
+        "position": 5, "parent_id": str(guild_id + 2), "permission_overwrites": [],
+    }, history=args.messages)
+
+    started = time.perf_counter()
+    close = fake.click(guild_id, channel_id, HOST_USER_ID, "close_ticket")
+    await wait_for(lambda: fake.uploads, args.timeout, "the transcript upload")
+    seconds = time.perf_counter() - started
+    await wait_for(lambda: channel_id in fake.deleted, args.timeout, "the ticket channel to be deleted")
+    return {"events": args.messages, "seconds": seconds,
+            "ack": fake.latencies([close], fake.acks), "done": [fake.uploads[0] - fake.injected[close]],
+            "notes": f"deleted after {time.perf_counter() - started:.1f}s (includes the 5s countdown)"}
+
+
+async def join_raid(fake: FakeDiscord, app, args) -> dict:
+    guild_id = FIRST_GUILD_ID
+    app.welcomer_store.set_channel(guild_id, "welcome", guild_id + 1)
+    joined, handled = {}, []
+    on_member_join = app.bot.on_member_join
+
+    async def timed_on_member_join(member):
+        await on_member_join(member)
+        handled.append(time.perf_counter() - joined[member.id])
+    app.bot.on_member_join = timed_on_member_join
+
+    started = time.perf_counter()
+    for n in range(args.joins):
+        user_id = 10**9 + n
+        joined[user_id] = time.perf_counter()
+        fake.state.parse_guild_member_add({**member_payload(user_id), "guild_id": str(guild_id)})
+        if n % args.burst == args.burst - 1:
+            await asyncio.sleep(0)
+    await wait_for(lambda: len(handled) == args.joins, args.timeout, "on_member_join handlers")
+    seconds = time.perf_counter() - started
+    await settle(app, args.timeout)
+    posts = fake.calls["POST /channels/{id}/messages"]
+    return {"events": args.joins, "seconds": seconds, "ack": [], "done": handled,
+            "notes": f"{posts} welcome message(s) posted"}
+
+
+SCENARIO_RUNNERS = {
+    "giveaway-storm": giveaway_storm,
+    "ticket-open": ticket_open,
+    "ticket-close": ticket_close,
+    "join-raid": join_raid,
+}
+
+
+async def monitor_lag(samples: list):
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + 0.01
+        await asyncio.sleep(0.01)
+        samples.append(loop.time() - expected)
+
+
+async def run(args) -> dict:
+    sys.path.insert(0, ROOT)
+    fake = FakeDiscord(args)
+    base = await fake.start()
+    import discord
+    discord.http.Route.BASE = base
+    import app
+
+    # Handler errors would otherwise vanish: app.py hooks discord's logger, so the last-resort handler never fires
+    handler = logging.StreamHandler()
+    handler.setLevel(logging.ERROR)
+    logging.getLogger("discord").addHandler(handler)
+    fake.state = app.bot._connection
+    await app.bot.login("bench-token")  # runs setup_hook against the stand-in
+    for n in range(args.guilds):
+        fake.state._add_guild_from_data(guild_payload(FIRST_GUILD_ID * (n + 1), args.members))
+    app.bot._ready.set()  # no READY event without a gateway connection
+    calls_before = Counter(fake.calls)
+
+    lags = []
+    lag_task = asyncio.create_task(monitor_lag(lags))
+    result = await SCENARIO_RUNNERS[args.child](fake, app, args)
+    lag_task.cancel()
+
+    calls = fake.calls - calls_before
+    ms = lambda seconds: None if seconds is None else round(seconds * 1000, 1)
+    report = {
+        "scenario": args.child,
+        "events": result["events"],
+        "seconds": round(result["seconds"], 3),
+        "per_second": round(result["events"] / result["seconds"], 1) if result["seconds"] else None,
+        "ack_p50_ms": ms(percentile(result["ack"], 0.5)),
+        "ack_p99_ms": ms(percentile(result["ack"], 0.99)),
+        "done_p50_ms": ms(percentile(result["done"], 0.5)),
+        "done_p99_ms": ms(percentile(result["done"], 0.99)),
+        "api_calls": sum(calls.values()),
+        "http_429": fake.limited,
+        "max_lag_ms": ms(max(lags, default=0)),
+        "peak_rss_mb": peak_rss_mb(),
+        "notes": result.get("notes", ""),
+        "calls": dict(calls.most_common()),
+    }
+    await app.bot.close()
+    app.transcript_renderer.shutdown()
+    return report
+
+
+def run_scenario(scenario: str, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            STATE_DB=os.path.join(tmp, "bench.db"),
+            TRANSCRIPT_DB=os.path.join(tmp, "transcripts.db"),
+            TRANSCRIPT_ARCHIVE_DIR=os.path.join(tmp, "transcripts"),
+            WATCHDOG_LOG=os.path.join(tmp, "loop_stalls.log"),
+            HEALTH_PORT="0",
+            TICKET_POOL_SIZE=str(args.pool),
+            WELCOME_BURST_WINDOW=str(args.burst_window),
+        )
+        cmd = [sys.executable, os.path.abspath(__file__), "--child", scenario, *sys.argv[1:]]
+        result = subprocess.run(cmd, env=env, cwd=tmp, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(f"scenario {scenario!r} failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--latency-ms", type=float, default=20, help="mean REST latency")
+    parser.add_argument("--ratelimit", type=float, default=0.0, help="fraction of REST calls answered with a 429")
+    parser.add_argument("--guilds", type=int, default=10)
+    parser.add_argument("--members", type=int, default=100, help="cached members per guild")
+    parser.add_argument("--entries", type=int, default=5000, help="giveaway-storm entrants")
+    parser.add_argument("--users", type=int, default=300, help="ticket-open users")
+    parser.add_argument("--pool", type=int, default=0, help="warm ticket channels per guild (TICKET_POOL_SIZE)")
+    parser.add_argument("--messages", type=int, default=50000, help="ticket-close history length")
+    parser.add_argument("--joins", type=int, default=2000, help="join-raid members")
+    parser.add_argument("--burst-window", type=float, default=2.0, help="WELCOME_BURST_WINDOW for join-raid")
+    parser.add_argument("--burst", type=int, default=100, help="events injected between event loop yields")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--calls", action="store_true", help="also print API calls per route")
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(run(args))))
+        return
+
+    print(f"REST latency {args.latency_ms:g} ms, {args.ratelimit:.0%} rate limited, {args.guilds} guilds\n")
+    columns = ["scenario", "events", "seconds", "per_second", "ack_p50_ms", "ack_p99_ms", "done_p50_ms",
+               "done_p99_ms", "api_calls", "http_429", "max_lag_ms", "peak_rss_mb", "notes"]
+    rows = [run_scenario(scenario, args) for scenario in args.scenarios.split(",")]
+    widths = [max(len(c), *(len(str(r[c])) for r in rows)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(("-" if row[c] is None else str(row[c])).ljust(w) for c, w in zip(columns, widths)))
+    if args.calls:
+        for row in rows:
+            print(f"\n{row['scenario']}:")
+            for route, count in row["calls"].items():
+                print(f"  {count:>7}  {route}")
+
+
+if __name__ == "__main__":
+    main()
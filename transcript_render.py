@@ -0,0 +1,106 @@
+"""Transcript rendering for app.py's ticket close flow.
+
+Runs in the transcript process pool, so it only depends on the standard
+library: workers import this module, not the bot. Messages arrive as plain
+records built by ``app.message_record``.
+"""
+from datetime import datetime, timezone
+from html import escape
+
+HTML_HEAD = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>Transcript - {title}</title>
+<style>
+body {{ background: #313338; color: #dbdee1; font-family: "gg sans", "Helvetica Neue", Arial, sans-serif; margin: 0; padding: 16px; }}
+h1 {{ font-size: 18px; border-bottom: 1px solid #3f4147; padding-bottom: 8px; }}
+.msg {{ display: flex; gap: 12px; padding: 6px 0; }}
+.avatar {{ width: 40px; height: 40px; border-radius: 50%; flex-shrink: 0; }}
+.author {{ font-weight: 600; color: #f2f3f5; }}
+.bot {{ background: #5865f2; color: #fff; font-size: 10px; border-radius: 3px; padding: 1px 4px; margin-left: 4px; }}
+.time {{ color: #949ba4; font-size: 12px; margin-left: 6px; }}
+.content {{ white-space: pre-wrap; word-wrap: break-word; }}
+.reply {{ color: #949ba4; font-size: 13px; }}
+.reply a, .attachment a, .embed a {{ color: #00a8fc; }}
+.embed {{ border-left: 4px solid #1e1f22; background: #2b2d31; border-radius: 4px; padding: 8px 12px; margin-top: 4px; max-width: 520px; }}
+.embed-title {{ font-weight: 600; }}
+.embed-field {{ margin-top: 4px; }}
+.embed-field-name {{ font-weight: 600; }}
+.embed img {{ max-width: 100%; margin-top: 6px; border-radius: 4px; }}
+.footer {{ color: #949ba4; font-size: 12px; margin-top: 4px; }}
+</style>
+</head>
+<body>
+<h1>Transcript - {title}</h1>
+"""
+HTML_EMPTY = "<p>No messages were sent in this ticket.</p>\n"
+HTML_FOOT = "</body>\n</html>\n"
+
+
+def html_head(title: str) -> str:
+    return HTML_HEAD.format(title=escape(title))
+
+
+def format_time(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def render_text(record: dict) -> str:
+    line = f"[{format_time(record['created_at'])}] {record['author']}: {record['content']}\n"
+    for filename, url, _ in record["attachments"]:
+        line += f"    📎 {filename}: {url}\n"
+    return line
+
+
+def render_embed(embed: dict) -> str:
+    color = embed.get("color")
+    style = f' style="border-left-color: #{color:06x}"' if color is not None else ""
+    parts = [f'<div class="embed"{style}>']
+    if "author" in embed and embed["author"].get("name"):
+        parts.append(f'<div class="footer">{escape(embed["author"]["name"])}</div>')
+    if "title" in embed:
+        title = escape(embed["title"])
+        if "url" in embed:
+            title = f'<a href="{escape(embed["url"])}">{title}</a>'
+        parts.append(f'<div class="embed-title">{title}</div>')
+    if "description" in embed:
+        parts.append(f'<div class="content">{escape(embed["description"])}</div>')
+    for field in embed.get("fields", ()):
+        parts.append(
+            f'<div class="embed-field"><div class="embed-field-name">{escape(field.get("name", ""))}</div>'
+            f'<div class="content">{escape(field.get("value", ""))}</div></div>'
+        )
+    for key in ("image", "thumbnail"):
+        if key in embed and embed[key].get("url"):
+            parts.append(f'<img src="{escape(embed[key]["url"])}" alt="">')
+    if "footer" in embed and embed["footer"].get("text"):
+        parts.append(f'<div class="footer">{escape(embed["footer"]["text"])}</div>')
+    parts.append("</div>")
+    return "".join(parts)
+
+
+def render_html(record: dict) -> str:
+    parts = [f'<div class="msg" id="m{record["id"]}">']
+    parts.append(f'<img class="avatar" src="{escape(record["avatar_url"])}" alt="">')
+    parts.append("<div>")
+    if record["reply_to"]:
+        parts.append(f'<div class="reply">↪ <a href="#m{record["reply_to"]}">replying to a message</a></div>')
+    badge = '<span class="bot">BOT</span>' if record["bot"] else ""
+    parts.append(
+        f'<span class="author" title="{escape(record["author"])} ({record["author_id"]})">{escape(record["display_name"])}</span>'
+        f'{badge}<span class="time">{format_time(record["created_at"])}</span>'
+    )
+    if record["content"]:
+        parts.append(f'<div class="content">{escape(record["content"])}</div>')
+    for filename, url, size in record["attachments"]:
+        parts.append(f'<div class="attachment">📎 <a href="{escape(url)}">{escape(filename)}</a> ({size:,} bytes)</div>')
+    for embed in record["embeds"]:
+        parts.append(render_embed(embed))
+    parts.append("</div></div>\n")
+    return "".join(parts)
+
+
+def render_page(records: list) -> tuple:
+    """Render one page of message records as UTF-8 (plain text, HTML)."""
+    return "".join(map(render_text, records)).encode(), "".join(map(render_html, records)).encode()